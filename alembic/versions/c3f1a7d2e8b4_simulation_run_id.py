@@ -0,0 +1,32 @@
+"""simulation run_id
+
+Revision ID: c3f1a7d2e8b4
+Revises: 94d9e811ed18
+Create Date: 2026-10-18 12:10:41.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f1a7d2e8b4'
+down_revision: Union[str, None] = '94d9e811ed18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ('persons', 'person_movements', 'sales'):
+        op.add_column(table, sa.Column('run_id', sa.String(length=32), nullable=True))
+        op.create_index(op.f(f'ix_{table}_run_id'), table, ['run_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ('sales', 'person_movements', 'persons'):
+        op.drop_index(op.f(f'ix_{table}_run_id'), table_name=table)
+        op.drop_column(table, 'run_id')
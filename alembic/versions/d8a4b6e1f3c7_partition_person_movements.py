@@ -0,0 +1,77 @@
+"""partition person_movements
+
+Revision ID: d8a4b6e1f3c7
+Revises: c3f1a7d2e8b4
+Create Date: 2026-10-18 13:02:17.530981
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8a4b6e1f3c7'
+down_revision: Union[str, None] = 'c3f1a7d2e8b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS = 8
+
+COLUMNS = "id, person_id, map_id, x, y, z, run_id, created_at"
+
+# Имена ограничений по умолчанию из init; новая таблица получает те же имена
+CONSTRAINTS = ("person_movements_pkey", "person_movements_person_id_fkey", "person_movements_map_id_fkey")
+
+
+def _recreate(partitioned: bool) -> None:
+    # Таблицу нельзя секционировать на месте: создаём новую и переносим строки
+    op.drop_index('ix_person_movements_id', table_name='person_movements')
+    op.drop_index('ix_person_movements_run_id', table_name='person_movements')
+    op.execute("ALTER TABLE person_movements RENAME TO person_movements_old")
+    # Иначе PostgreSQL назовёт ограничения новой таблицы person_movements_pkey1 и т.п.
+    for name in CONSTRAINTS:
+        op.execute(f"ALTER TABLE person_movements_old RENAME CONSTRAINT {name} TO {name}_old")
+    # Последовательность id принадлежит старой таблице и иначе удалится вместе с ней
+    op.execute("ALTER SEQUENCE person_movements_id_seq OWNED BY NONE")
+    primary_key = "PRIMARY KEY (id, map_id)" if partitioned else "PRIMARY KEY (id)"
+    partition_by = " PARTITION BY HASH (map_id)" if partitioned else ""
+    op.execute(f"""
+        CREATE TABLE person_movements (
+            id INTEGER NOT NULL DEFAULT nextval('person_movements_id_seq'),
+            person_id INTEGER NOT NULL CONSTRAINT person_movements_person_id_fkey REFERENCES persons (id),
+            map_id INTEGER NOT NULL CONSTRAINT person_movements_map_id_fkey REFERENCES maps (id),
+            x INTEGER NOT NULL,
+            y INTEGER NOT NULL,
+            z INTEGER NOT NULL,
+            run_id VARCHAR(32),
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            CONSTRAINT person_movements_pkey {primary_key}
+        ){partition_by}
+    """)
+    if partitioned:
+        for remainder in range(PARTITIONS):
+            op.execute(
+                f"CREATE TABLE person_movements_p{remainder} PARTITION OF person_movements "
+                f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})"
+            )
+    op.execute(f"INSERT INTO person_movements ({COLUMNS}) SELECT {COLUMNS} FROM person_movements_old")
+    op.execute("DROP TABLE person_movements_old")
+    op.execute("ALTER SEQUENCE person_movements_id_seq OWNED BY person_movements.id")
+    op.create_index(op.f('ix_person_movements_id'), 'person_movements', ['id'], unique=False)
+    op.create_index(op.f('ix_person_movements_run_id'), 'person_movements', ['run_id'], unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _recreate(partitioned=True)
+    op.create_index('ix_person_movements_map_id_x_z', 'person_movements', ['map_id', 'x', 'z'], unique=False)
+    op.create_index('ix_person_movements_map_id_created_at', 'person_movements', ['map_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_person_movements_map_id_created_at', table_name='person_movements')
+    op.drop_index('ix_person_movements_map_id_x_z', table_name='person_movements')
+    _recreate(partitioned=False)
@@ -0,0 +1,28 @@
+"""sales map_id product_id index
+
+Revision ID: e5b9c2d7a1f4
+Revises: d8a4b6e1f3c7
+Create Date: 2026-10-18 13:41:05.118342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b9c2d7a1f4'
+down_revision: Union[str, None] = 'd8a4b6e1f3c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_sales_map_id_product_id', 'sales', ['map_id', 'product_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_sales_map_id_product_id', table_name='sales')
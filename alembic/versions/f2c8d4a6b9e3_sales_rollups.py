@@ -0,0 +1,93 @@
+"""sales rollups
+
+Revision ID: f2c8d4a6b9e3
+Revises: e5b9c2d7a1f4
+Create Date: 2026-10-18 14:12:44.207519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c8d4a6b9e3'
+down_revision: Union[str, None] = 'e5b9c2d7a1f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BASE_PRICE = 100.0
+
+APPLY_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION sales_rollups_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE sales_rollups AS r
+        SET count_sold = r.count_sold - d.count_sold,
+            revenue = r.revenue - d.revenue,
+            discounted_sold = r.discounted_sold - d.discounted_sold
+        FROM (
+            SELECT map_id, product_id, date_trunc('hour', created_at) AS bucket,
+                   count(*) AS count_sold, sum(price) AS revenue,
+                   count(*) FILTER (WHERE price < {BASE_PRICE}) AS discounted_sold
+            FROM old_rows
+            GROUP BY 1, 2, 3
+        ) AS d
+        WHERE r.map_id = d.map_id AND r.product_id = d.product_id AND r.bucket = d.bucket;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO sales_rollups (map_id, product_id, bucket, count_sold, revenue, discounted_sold)
+        SELECT map_id, product_id, date_trunc('hour', created_at),
+               count(*), sum(price), count(*) FILTER (WHERE price < {BASE_PRICE})
+        FROM new_rows
+        GROUP BY 1, 2, 3
+        ON CONFLICT (map_id, product_id, bucket) DO UPDATE
+        SET count_sold = sales_rollups.count_sold + EXCLUDED.count_sold,
+            revenue = sales_rollups.revenue + EXCLUDED.revenue,
+            discounted_sold = sales_rollups.discounted_sold + EXCLUDED.discounted_sold;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+TRIGGERS = {
+    "sales_rollups_insert": "AFTER INSERT ON sales REFERENCING NEW TABLE AS new_rows",
+    "sales_rollups_update": "AFTER UPDATE ON sales REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "sales_rollups_delete": "AFTER DELETE ON sales REFERENCING OLD TABLE AS old_rows",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('sales_rollups',
+    sa.Column('map_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('count_sold', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('revenue', sa.Float(), server_default='0.0', nullable=False),
+    sa.Column('discounted_sold', sa.BigInteger(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['map_id'], ['maps.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('map_id', 'product_id', 'bucket')
+    )
+    op.execute(APPLY_FUNCTION)
+    # Сводку по уже накопленным продажам заполняем до создания триггеров
+    op.execute(f"""
+        INSERT INTO sales_rollups (map_id, product_id, bucket, count_sold, revenue, discounted_sold)
+        SELECT map_id, product_id, date_trunc('hour', created_at),
+               count(*), sum(price), count(*) FILTER (WHERE price < {BASE_PRICE})
+        FROM sales
+        GROUP BY 1, 2, 3
+    """)
+    for name, timing in TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER {name} {timing} FOR EACH STATEMENT EXECUTE FUNCTION sales_rollups_apply()")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in TRIGGERS:
+        op.execute(f"DROP TRIGGER {name} ON sales")
+    op.execute("DROP FUNCTION sales_rollups_apply()")
+    op.drop_table('sales_rollups')
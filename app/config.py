@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import AnyHttpUrl, ConfigDict, BaseModel
 from pydantic_settings import BaseSettings
 
@@ -9,6 +11,19 @@ class Settings(BaseSettings):
 
     WORKERS: int
     HOST: str
+    PORT: int = 8082
+    # Сколько секунд воркер дожидается текущих запросов при остановке и перезапуске (SIGHUP)
+    GRACEFUL_TIMEOUT: int = 30
+
+    # Пул соединений с БД на все воркеры вместе, делится поровну между ними
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+
+    # Очередь фоновых симуляций: число процессов и максимум задач в очереди и в работе
+    SIMULATION_WORKERS: int = 2
+    SIMULATION_QUEUE_DEPTH: int = 16
+    # Каталог результатов фоновых симуляций, общий для воркеров; по умолчанию во временном каталоге
+    SIMULATION_RESULTS_DIR: Optional[str] = None
     
     model_config = ConfigDict(env_file=".env", env_file_encoding="utf-8")   
 
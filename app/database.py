@@ -11,11 +11,15 @@ from contextlib import asynccontextmanager
 from .base import Base
 
 
+# У каждого воркера uvicorn свой движок, поэтому общий лимит соединений делится между ними
+POOL_SIZE = max(1, settings.DB_POOL_SIZE // max(1, settings.WORKERS))
+MAX_OVERFLOW = max(0, settings.DB_MAX_OVERFLOW // max(1, settings.WORKERS))
+
 engine = create_async_engine(
     url=settings.SQLALCHEMY_DATABASE_URL,
     echo=False,  # Логирование SQL-запросов (True для отладки)
-    pool_size=10,  # Размер пула соединений
-    max_overflow=20,  # Дополнительные соединения при высокой нагрузке
+    pool_size=POOL_SIZE,  # Размер пула соединений воркера
+    max_overflow=MAX_OVERFLOW,  # Дополнительные соединения при высокой нагрузке
     pool_timeout=30,  # Тайм-аут ожидания свободного соединения
     pool_recycle=1800,  # Рецикл соединений для предотвращения разрывов
     pool_pre_ping=True,  # Проверка соединений перед использованием
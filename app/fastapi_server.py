@@ -10,7 +10,8 @@ from fastapi.openapi.utils import get_openapi
 from sqlalchemy.orm import Session
 from fastapi.staticfiles import StaticFiles
 
-from app.routers import router_maps, router_products,  router_simulations, router_shelves, router_kasses, router_categories
+from app.routers import router_maps, router_products,  router_simulations, router_shelves, router_kasses, router_categories, router_sales
+from app.utils.jobs import simulation_jobs, start_jobs_manager
 
 app = FastAPI(
     title="Hackaton",
@@ -37,6 +38,12 @@ app.include_router(router_products)
 app.include_router(router_categories )
 app.include_router(router_kasses)
 app.include_router(router_simulations)
+app.include_router(router_sales)
+
+# Остановка пула фоновых симуляций
+@app.on_event("shutdown")
+async def shutdown_simulation_jobs():
+    await simulation_jobs.shutdown(timeout=settings.GRACEFUL_TIMEOUT)
 
 # Обработка исключений
 @app.exception_handler(StarletteHTTPException)
@@ -73,9 +80,25 @@ def custom_openapi():
 
 app.openapi = custom_openapi
 
-# Асинхронный запуск Uvicorn-сервера
-async def start_uvicorn():
-    config = uvicorn.Config(app, host=settings.HOST, port=8082, workers=settings.WORKERS)
-    server = uvicorn.Server(config)
-    await server.serve()
-
+# Запуск Uvicorn-сервера
+def run_uvicorn():
+    """
+    Запускает settings.WORKERS процессов uvicorn на общем сокете.
+    При WORKERS > 1 родитель-супервизор перезапускает упавшие воркеры,
+    а по SIGHUP по очереди мягко перезапускает все (SIGTTIN/SIGTTOU
+    добавляют и убирают воркер). Приложение передаётся строкой импорта,
+    чтобы каждый воркер загрузил его и создал свой пул соединений сам.
+    Реестр фоновых симуляций поднимается здесь, до воркеров, чтобы
+    статус задачи был виден из любого из них.
+    """
+    jobs_manager = start_jobs_manager()
+    try:
+        uvicorn.run(
+            "app.fastapi_server:app",
+            host=settings.HOST,
+            port=settings.PORT,
+            workers=settings.WORKERS,
+            timeout_graceful_shutdown=settings.GRACEFUL_TIMEOUT,
+        )
+    finally:
+        jobs_manager.shutdown()
@@ -1,6 +1,6 @@
 from .maps import Maps
 from .products import Products
-from .persons import Persons, PersonMovements, Sales
+from .persons import Persons, PersonMovements, Sales, SalesRollups
 from .shelves import Shelves
 from .kasses import Kasses
 from .categories import Categories
\ No newline at end of file
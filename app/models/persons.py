@@ -1,7 +1,10 @@
 import random
 from typing import List, Optional
 from sqlalchemy import (
+    DDL,
     Float,
+    Index,
+    event,
     ForeignKey,
     String,
     Integer,
@@ -11,6 +14,7 @@ from sqlalchemy import (
     Sequence,
     and_,
     func,
+    insert,
     or_,
     select,
     text,
@@ -40,6 +44,7 @@ class Persons(Base):
     map_id: Mapped[int] = mapped_column(Integer, ForeignKey("maps.id"))
     target_product: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     preferences: Mapped[List[str]] = mapped_column(JSON, default=[], server_default='[]') # Пример: ['Любит скидки']
+    run_id: Mapped[Optional[str]] = mapped_column(String(32), nullable=True, index=True)  # Прогон симуляции, None — создан вручную
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default='now()')    
 
     map: Mapped['Maps'] = relationship('Maps', back_populates='persons', uselist=False)
@@ -52,18 +57,35 @@ class Persons(Base):
     @staticmethod
     async def create(session: AsyncSession, payload: person_schemas.PersonCreate) -> "Persons":
         new_person = Persons(**payload.dict())
-        products = await Products.get_all(session)
-        if products != []:
-            if random.random() > 0.5:
-                rand_products = random.choice(products)
-                new_person.target_product = rand_products.name
-            else:
-                new_person.target_product = None
+        # Целевой товар есть у половины людей и берётся со стеллажей их карты
+        if random.random() > 0.5:
+            new_person.target_product = await Products.get_random_name(session, payload.map_id)
         else:
             new_person.target_product = None
         session.add(new_person)
         await session.commit()
         return new_person
+
+    @staticmethod
+    async def create_many(session: AsyncSession, payloads: List[person_schemas.PersonCreate]) -> List["Persons"]:
+        """
+        Пакетное создание людей: товары всех нужных карт читаются одним
+        запросом, строки вставляются через INSERT ... VALUES ... RETURNING
+        (SQLAlchemy склеивает их в многострочные пакеты).
+        """
+        if not payloads:
+            return []
+        names = await Products.get_names_by_map_ids(session, {payload.map_id for payload in payloads})
+        rows = []
+        for payload in payloads:
+            row = payload.dict()
+            products = names.get(payload.map_id)
+            row["target_product"] = random.choice(products) if products and random.random() > 0.5 else None
+            rows.append(row)
+        result = await session.scalars(insert(Persons).returning(Persons), rows)
+        persons = result.all()
+        await session.commit()
+        return persons
     
     @staticmethod
     async def get_by_id(session: AsyncSession, person_id: int) -> Optional["Persons"]:
@@ -90,15 +112,27 @@ class Persons(Base):
         return result.scalars().all()
 
 
+# Число hash-секций person_movements по map_id
+PERSON_MOVEMENTS_PARTITIONS = 8
+
+
 class PersonMovements(Base):
     __tablename__ = "person_movements"
+    # Секционирование по map_id: запросы по карте читают одну секцию.
+    # Ключ секционирования обязан входить в первичный ключ
+    __table_args__ = (
+        Index("ix_person_movements_map_id_x_z", "map_id", "x", "z"),
+        Index("ix_person_movements_map_id_created_at", "map_id", "created_at"),
+        {"postgresql_partition_by": "HASH (map_id)"},
+    )
     
     id: Mapped[int] = mapped_column(Integer, autoincrement=True, index=True, primary_key=True)
     person_id: Mapped[int] = mapped_column(Integer, ForeignKey("persons.id"))
-    map_id: Mapped[int] = mapped_column(Integer, ForeignKey("maps.id"))
+    map_id: Mapped[int] = mapped_column(Integer, ForeignKey("maps.id"), primary_key=True)
     x: Mapped[int] = mapped_column(Integer)
     y: Mapped[int] = mapped_column(Integer)
     z: Mapped[int] = mapped_column(Integer)
+    run_id: Mapped[Optional[str]] = mapped_column(String(32), nullable=True, index=True)
     
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default='now()')    
 
@@ -114,9 +148,56 @@ class PersonMovements(Base):
         result = await session.execute(stmt)
         return result.scalars().all()
 
+    @staticmethod
+    async def get_heatmap(
+        session: AsyncSession,
+        map_id: int,
+        run_id: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[dict]:
+        """
+        Посещения клеток карты, посчитанные в БД (GROUP BY x, z),
+        по убыванию. Фильтры: прогон симуляции и интервал created_at.
+        """
+        visits = func.count().label("visits")
+        stmt = (
+            select(PersonMovements.x, PersonMovements.z, visits)
+            .where(PersonMovements.map_id == map_id)
+            .group_by(PersonMovements.x, PersonMovements.z)
+            .order_by(visits.desc())
+        )
+        if run_id is not None:
+            stmt = stmt.where(PersonMovements.run_id == run_id)
+        if start is not None:
+            stmt = stmt.where(PersonMovements.created_at >= start)
+        if end is not None:
+            stmt = stmt.where(PersonMovements.created_at < end)
+        result = await session.execute(stmt)
+        return [{"x": row.x, "z": row.z, "visits": row.visits} for row in result.all()]
+
+
+# Секции создаются вместе с таблицей при metadata.create_all
+for _remainder in range(PERSON_MOVEMENTS_PARTITIONS):
+    event.listen(
+        PersonMovements.__table__,
+        "after_create",
+        DDL(
+            f"CREATE TABLE IF NOT EXISTS person_movements_p{_remainder} PARTITION OF person_movements "
+            f"FOR VALUES WITH (MODULUS {PERSON_MOVEMENTS_PARTITIONS}, REMAINDER {_remainder})"
+        ).execute_if(dialect="postgresql"),
+    )
+
+
+# Базовая цена товара для сводки: продажа дешевле неё считается продажей со скидкой
+ROLLUP_BASE_PRICE = 100.0
+
 
 class Sales(Base):
     __tablename__ = "sales"
+    __table_args__ = (
+        Index("ix_sales_map_id_product_id", "map_id", "product_id"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, autoincrement=True, index=True, primary_key=True)
     person_id: Mapped[int] = mapped_column(Integer, ForeignKey("persons.id"))
@@ -124,6 +205,7 @@ class Sales(Base):
     product_id: Mapped[int] = mapped_column(Integer, ForeignKey("products.id"))
     
     price: Mapped[float] = mapped_column(Float, default=0.0, server_default='0.0')
+    run_id: Mapped[Optional[str]] = mapped_column(String(32), nullable=True, index=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default='now()')    
 
@@ -131,57 +213,72 @@ class Sales(Base):
     map = relationship("Maps", back_populates="sales")
     person = relationship("Persons", back_populates="sales")
     @staticmethod
-    async def get_total_sales(session: AsyncSession, map_id: int) -> int:
+    def per_product_stmt(map_id: int, base_price: float = ROLLUP_BASE_PRICE, run_id: Optional[str] = None):
+        """
+        Продажи карты по товарам: count_sold, revenue, discounted_sold.
+        Читает sales_rollups, если запрос укладывается в сводку (без run_id
+        и с базовой ценой ROLLUP_BASE_PRICE), иначе агрегирует sales.
+        """
+        if run_id is None and base_price == ROLLUP_BASE_PRICE:
+            return (
+                select(
+                    SalesRollups.product_id,
+                    func.sum(SalesRollups.count_sold).label("count_sold"),
+                    func.sum(SalesRollups.revenue).label("revenue"),
+                    func.sum(SalesRollups.discounted_sold).label("discounted_sold"),
+                )
+                .where(SalesRollups.map_id == map_id)
+                .group_by(SalesRollups.product_id)
+                .having(func.sum(SalesRollups.count_sold) > 0)
+            )
         stmt = (
-            select(func.count(Sales.id))
+            select(
+                Sales.product_id,
+                func.count(Sales.id).label("count_sold"),
+                func.sum(Sales.price).label("revenue"),
+                func.count(Sales.id).filter(Sales.price < base_price).label("discounted_sold"),
+            )
             .where(Sales.map_id == map_id)
+            .group_by(Sales.product_id)
+        )
+        if run_id is not None:
+            stmt = stmt.where(Sales.run_id == run_id)
+        return stmt
+
+    @staticmethod
+    async def get_total_sales(session: AsyncSession, map_id: int) -> int:
+        stmt = (
+            select(func.coalesce(func.sum(SalesRollups.count_sold), 0))
+            .where(SalesRollups.map_id == map_id)
         )
         result = await session.execute(stmt)
-        return result.scalar()  # or result.first()[0]
+        return int(result.scalar())
 
     @staticmethod
     async def get_total_revenue(session: AsyncSession, map_id: int) -> float:
         stmt = (
-            select(func.sum(Sales.price))
-            .where(Sales.map_id == map_id)
+            select(func.sum(SalesRollups.revenue))
+            .where(SalesRollups.map_id == map_id)
         )
         result = await session.execute(stmt)
-        return result.scalar() or 0.0
+        return float(result.scalar() or 0.0)
 
     @staticmethod
-    async def get_sales_grouped_by_product(session: AsyncSession, map_id: int):
+    async def get_sales_grouped_by_product(session: AsyncSession, map_id: int, run_id: Optional[str] = None):
         """
         Возвращает список словарей, где по каждому product_id
         указаны общий счётчик продаж и суммарная выручка.
+        С run_id — только продажи этого прогона симуляции.
         """
-        # Используем select(...) вместо session.query(...) для асинхронного стиля
-        stmt = (
-            select(
-                Sales.product_id,
-                func.count(Sales.id).label("count_sold"),
-                func.sum(Sales.price).label("revenue")
-            )
-            .where(Sales.map_id == map_id)
-            .group_by(Sales.product_id)
-        )
-
-        # Выполняем запрос
-        result = await session.execute(stmt)
-        rows = result.all()  # Список Row-объектов
-
-        # Преобразуем строки в удобный формат
-        # Предположим, каждая row будет вида (product_id, count_sold, revenue)
-        # либо Row(product_id=..., count_sold=..., revenue=...)
-        grouped = []
-        for row in rows:
-            # Если row — это Row-объект, можно обращаться через row.product_id (или row[0], в зависимости от версии SQLAlchemy)
-            grouped.append({
+        result = await session.execute(Sales.per_product_stmt(map_id, run_id=run_id))
+        return [
+            {
                 "product_id": row.product_id,
-                "count_sold": row.count_sold,
+                "count_sold": int(row.count_sold),
                 "revenue": float(row.revenue or 0)
-            })
-
-        return grouped
+            }
+            for row in result.all()
+        ]
     
     @staticmethod
     async def get_discount_effectiveness(session: AsyncSession, map_id: int, base_price: float = 100.0):
@@ -193,22 +290,14 @@ class Sales(Base):
         :param map_id: id карты (магазина)
         :param base_price: базовая цена (упрощённо 100)
         """
-        # Сколько продаж было сделано дешевле, чем base_price (т. е. со скидкой)
-        discounted_stmt = (
-            select(func.count(Sales.id))
-            .where(Sales.map_id == map_id)
-            .where(Sales.price < base_price)
+        per_product = Sales.per_product_stmt(map_id, base_price=base_price).subquery()
+        stmt = select(
+            func.sum(per_product.c.discounted_sold).label("discounted_sales"),
+            func.sum(per_product.c.count_sold).label("total_sales"),
         )
-        discounted_result = await session.execute(discounted_stmt)
-        discounted_sales = discounted_result.scalar() or 0
-
-        # Общее количество продаж
-        total_stmt = (
-            select(func.count(Sales.id))
-            .where(Sales.map_id == map_id)
-        )
-        total_result = await session.execute(total_stmt)
-        total_sales = total_result.scalar() or 0
+        row = (await session.execute(stmt)).one()
+        discounted_sales = int(row.discounted_sales or 0)
+        total_sales = int(row.total_sales or 0)
 
         if total_sales == 0:
             return {
@@ -223,4 +312,155 @@ class Sales(Base):
             "discounted_sales": discounted_sales,
             "total_sales": total_sales,
             "discount_ratio": ratio
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    async def get_summary(
+        session: AsyncSession,
+        map_id: int,
+        base_price: float = 100.0,
+        run_id: Optional[str] = None,
+    ) -> dict:
+        """
+        Сводка продаж карты одним запросом: общее число продаж, выручка,
+        доля продаж со скидкой и разбивка по товарам. Итоги считаются
+        оконными суммами поверх CTE с группировкой по product_id.
+        """
+        per_product = Sales.per_product_stmt(map_id, base_price=base_price, run_id=run_id).cte("per_product")
+        stmt = (
+            select(
+                per_product,
+                func.sum(per_product.c.count_sold).over().label("total_sales"),
+                func.sum(per_product.c.revenue).over().label("total_revenue"),
+                func.sum(per_product.c.discounted_sold).over().label("discounted_sales"),
+            )
+            .order_by(per_product.c.revenue.desc())
+        )
+        rows = (await session.execute(stmt)).all()
+
+        if not rows:
+            return {
+                "total_sales": 0,
+                "total_revenue": 0.0,
+                "discounted_sales": 0,
+                "discount_ratio": 0,
+                "products": []
+            }
+
+        total_sales = int(rows[0].total_sales)
+        discounted_sales = int(rows[0].discounted_sales)
+        return {
+            "total_sales": total_sales,
+            "total_revenue": float(rows[0].total_revenue or 0),
+            "discounted_sales": discounted_sales,
+            "discount_ratio": discounted_sales / total_sales,
+            "products": [
+                {
+                    "product_id": row.product_id,
+                    "count_sold": int(row.count_sold),
+                    "revenue": float(row.revenue or 0),
+                    "discounted_sold": int(row.discounted_sold),
+                }
+                for row in rows
+            ]
+        }
+
+
+class SalesRollups(Base):
+    """
+    Почасовая сводка продаж по карте и товару. Ведётся триггерами на sales
+    (statement-level, через transition tables), поэтому вставка пачкой
+    или COPY обновляет сводку одним запросом на весь пакет.
+    """
+    __tablename__ = "sales_rollups"
+
+    map_id: Mapped[int] = mapped_column(Integer, ForeignKey("maps.id"), primary_key=True)
+    product_id: Mapped[int] = mapped_column(Integer, ForeignKey("products.id"), primary_key=True)
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)  # Начало часа
+    count_sold: Mapped[int] = mapped_column(BigInteger, default=0, server_default='0')
+    revenue: Mapped[float] = mapped_column(Float, default=0.0, server_default='0.0')
+    # Продажи дешевле ROLLUP_BASE_PRICE
+    discounted_sold: Mapped[int] = mapped_column(BigInteger, default=0, server_default='0')
+
+    @staticmethod
+    async def get_hourly(
+        session: AsyncSession,
+        map_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[dict]:
+        """Продажи карты по часам (все товары вместе)."""
+        stmt = (
+            select(
+                SalesRollups.bucket,
+                func.sum(SalesRollups.count_sold).label("count_sold"),
+                func.sum(SalesRollups.revenue).label("revenue"),
+                func.sum(SalesRollups.discounted_sold).label("discounted_sold"),
+            )
+            .where(SalesRollups.map_id == map_id)
+            .group_by(SalesRollups.bucket)
+            .order_by(SalesRollups.bucket)
+        )
+        if start is not None:
+            stmt = stmt.where(SalesRollups.bucket >= start)
+        if end is not None:
+            stmt = stmt.where(SalesRollups.bucket < end)
+        result = await session.execute(stmt)
+        return [
+            {
+                "bucket": row.bucket,
+                "count_sold": int(row.count_sold),
+                "revenue": float(row.revenue or 0),
+                "discounted_sold": int(row.discounted_sold),
+            }
+            for row in result.all()
+        ]
+
+
+# Ведение sales_rollups: вычитаем старые строки (DELETE, UPDATE) и добавляем новые (INSERT, UPDATE)
+SALES_ROLLUPS_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION sales_rollups_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE sales_rollups AS r
+        SET count_sold = r.count_sold - d.count_sold,
+            revenue = r.revenue - d.revenue,
+            discounted_sold = r.discounted_sold - d.discounted_sold
+        FROM (
+            SELECT map_id, product_id, date_trunc('hour', created_at) AS bucket,
+                   count(*) AS count_sold, sum(price) AS revenue,
+                   count(*) FILTER (WHERE price < {ROLLUP_BASE_PRICE}) AS discounted_sold
+            FROM old_rows
+            GROUP BY 1, 2, 3
+        ) AS d
+        WHERE r.map_id = d.map_id AND r.product_id = d.product_id AND r.bucket = d.bucket;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO sales_rollups (map_id, product_id, bucket, count_sold, revenue, discounted_sold)
+        SELECT map_id, product_id, date_trunc('hour', created_at),
+               count(*), sum(price), count(*) FILTER (WHERE price < {ROLLUP_BASE_PRICE})
+        FROM new_rows
+        GROUP BY 1, 2, 3
+        ON CONFLICT (map_id, product_id, bucket) DO UPDATE
+        SET count_sold = sales_rollups.count_sold + EXCLUDED.count_sold,
+            revenue = sales_rollups.revenue + EXCLUDED.revenue,
+            discounted_sold = sales_rollups.discounted_sold + EXCLUDED.discounted_sold;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+SALES_ROLLUPS_TRIGGERS = [
+    "CREATE TRIGGER sales_rollups_insert AFTER INSERT ON sales "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION sales_rollups_apply()",
+    "CREATE TRIGGER sales_rollups_update AFTER UPDATE ON sales "
+    "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION sales_rollups_apply()",
+    "CREATE TRIGGER sales_rollups_delete AFTER DELETE ON sales "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION sales_rollups_apply()",
+]
+
+# Триггеры ссылаются на обе таблицы, поэтому создаются после всей схемы
+event.listen(Base.metadata, "after_create", DDL(SALES_ROLLUPS_FUNCTION).execute_if(dialect="postgresql"))
+for _trigger in SALES_ROLLUPS_TRIGGERS:
+    event.listen(Base.metadata, "after_create", DDL(_trigger).execute_if(dialect="postgresql"))
@@ -73,11 +73,40 @@ class Products(Base):
     
     @staticmethod
     async def get_by_map_id(session: AsyncSession, map_id: int) -> List["Products"]:
+        from app.models import Shelves
         stmt = (
             select(Products)
-           .where(Products.map_id == map_id)
+           .join(Shelves, Products.shelf_id == Shelves.id)
+           .where(Shelves.map_id == map_id)
         )
         result = await session.execute(stmt)
         return result.scalars().all()
-    
-    
\ No newline at end of file
+
+    @staticmethod
+    async def get_random_name(session: AsyncSession, map_id: int) -> Optional[str]:
+        """Название случайного товара со стеллажей карты, выбирается в БД."""
+        from app.models import Shelves
+        stmt = (
+            select(Products.name)
+            .join(Shelves, Products.shelf_id == Shelves.id)
+            .where(Shelves.map_id == map_id)
+            .order_by(func.random())
+            .limit(1)
+        )
+        result = await session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def get_names_by_map_ids(session: AsyncSession, map_ids) -> dict:
+        """map_id -> названия товаров карты, одним запросом на все карты."""
+        from app.models import Shelves
+        stmt = (
+            select(Shelves.map_id, Products.name)
+            .join(Shelves, Products.shelf_id == Shelves.id)
+            .where(Shelves.map_id.in_(list(map_ids)))
+        )
+        result = await session.execute(stmt)
+        names = {}
+        for map_id, name in result.all():
+            names.setdefault(map_id, []).append(name)
+        return names
@@ -4,4 +4,5 @@ from .persons import router_persons
 from .simulations import router_simulations
 from .shelves import router_shelves
 from .kasses import router_kasses
-from .categories import router_categories
\ No newline at end of file
+from .categories import router_categories
+from .sales import router_sales
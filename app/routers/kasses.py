@@ -4,6 +4,7 @@ from fastapi.responses import JSONResponse
 from app.models import Maps, Kasses
 from app.dependencies import SessionDep
 from app.schemas import kasses as kasses_schemas
+from app.utils.store_models import store_model_cache
 
 router_kasses = APIRouter(prefix="/kasses", tags=["Кассы"])
 
@@ -29,6 +30,7 @@ async def create_kasses(
     payload: kasses_schemas.KassesCreate,
 ):
     kasses = await Kasses.create(session, payload)
+    store_model_cache.invalidate(payload.map_id)
     return kasses
     
 
@@ -71,6 +73,8 @@ async def delete_kassa(
     kassa = await Kasses.get_by_id(session, kassa_id)
     if not kassa:
         raise HTTPException(status_code=404, detail="Касса не найдена")
+    map_id = kassa.map_id
     await session.delete(kassa)
     await session.commit()
+    store_model_cache.invalidate(map_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
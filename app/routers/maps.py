@@ -1,9 +1,11 @@
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 from fastapi import APIRouter, HTTPException, Query, Request, Response, status, Path
 from fastapi.responses import JSONResponse
-from app.models import Maps
+from app.models import Maps, PersonMovements
 from app.dependencies import SessionDep
 from app.schemas import maps as map_schemas
+from app.utils.store_models import store_model_cache
 
 router_maps = APIRouter(prefix="/maps", tags=["Карты"])
 
@@ -60,6 +62,21 @@ async def get_map_full_info(
 
 
 
+@router_maps.get("/{map_id}/heatmap")
+async def get_map_heatmap(
+    session: SessionDep,
+    map_id: int,
+    run_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """Посещения клеток карты по сохранённым перемещениям, агрегированные в БД."""
+    map_ = await Maps.get_by_id(session, map_id)
+    if not map_:
+        raise HTTPException(status_code=404, detail="Карта не найдена")
+    return await PersonMovements.get_heatmap(session, map_id, run_id=run_id, start=start, end=end)
+
+
 @router_maps.delete(
     "/{map_id}",
     status_code=204
@@ -73,4 +90,5 @@ async def delete_map(
         raise HTTPException(status_code=404, detail="Карта не найдена")
     await session.delete(map_)
     await session.commit()
+    store_model_cache.invalidate(map_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -28,12 +28,7 @@ async def create_person(
     session: SessionDep,
     payload_list: List[persons_schemas.PersonCreate],
 ):
-    added_persons = []
-    for payload in payload_list:
-        person = await Persons.create(session, payload)
-        added_persons.append(person)
-        
-    return added_persons
+    return await Persons.create_many(session, payload_list)
 
 @router_persons.get(
     "/{person_id}",
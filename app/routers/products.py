@@ -4,6 +4,7 @@ from fastapi.responses import JSONResponse
 from app.models import Maps, Products, Shelves
 from app.dependencies import SessionDep
 from app.schemas import products as products_schemas
+from app.utils.store_models import store_model_cache
 
 router_products = APIRouter(prefix="/products", tags=["Продукты"])
 
@@ -36,6 +37,7 @@ async def create_product(
         raise HTTPException(status_code=403, detail="Стелаж переполнен")
     else:
         new_product = await Products.create(session, payload)
+        store_model_cache.invalidate(shelves.map_id)
         return new_product
 
 @router_products.get(
@@ -62,6 +64,9 @@ async def delete_product(
     product = await Products.get_by_id(session, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Продукт не найден")
+    shelf = await Shelves.get_by_id(session, product.shelf_id) if product.shelf_id else None
     await session.delete(product)
     await session.commit()
+    if shelf:
+        store_model_cache.invalidate(shelf.map_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
@@ -0,0 +1,35 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.models import Maps, Sales, SalesRollups
+from app.dependencies import SessionDep
+
+router_sales = APIRouter(prefix="/sales", tags=["Продажи"])
+
+
+@router_sales.get("/maps/{map_id}/summary")
+async def get_sales_summary(
+    session: SessionDep,
+    map_id: int,
+    base_price: float = Query(100.0, title="Базовая цена товара", gt=0),
+    run_id: Optional[str] = Query(None, title="Прогон симуляции"),
+):
+    """Продажи, выручка, доля продаж со скидкой и разбивка по товарам одним запросом."""
+    map_ = await Maps.get_by_id(session, map_id)
+    if not map_:
+        raise HTTPException(status_code=404, detail="Карта не найдена")
+    return await Sales.get_summary(session, map_id, base_price=base_price, run_id=run_id)
+
+
+@router_sales.get("/maps/{map_id}/hourly")
+async def get_sales_hourly(
+    session: SessionDep,
+    map_id: int,
+    start: Optional[datetime] = Query(None, title="Начало интервала"),
+    end: Optional[datetime] = Query(None, title="Конец интервала"),
+):
+    """Продажи карты по часам из сводки sales_rollups."""
+    map_ = await Maps.get_by_id(session, map_id)
+    if not map_:
+        raise HTTPException(status_code=404, detail="Карта не найдена")
+    return await SalesRollups.get_hourly(session, map_id, start=start, end=end)
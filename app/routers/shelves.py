@@ -4,6 +4,7 @@ from typing import List
 from app.dependencies import SessionDep
 from app.models import Shelves, Maps
 from app.schemas import shelves as shelves_schemas
+from app.utils.store_models import store_model_cache
 
 router_shelves = APIRouter(prefix="/shelves", tags=["Стеллажи"])
 
@@ -18,6 +19,7 @@ async def create_shelf(
         raise HTTPException(status_code=404, detail="Карта не найдена")
 
     new_shelf = await Shelves.create(session, payload)
+    store_model_cache.invalidate(payload.map_id)
     return new_shelf
 
 
@@ -58,6 +60,8 @@ async def delete_shelf(
     if not shelf:
         raise HTTPException(status_code=404, detail="Стеллаж не найден")
 
+    map_id = shelf.map_id
     await session.delete(shelf)
     await session.commit()
+    store_model_cache.invalidate(map_id)
     return {}
\ No newline at end of file
@@ -2,46 +2,213 @@ import asyncio
 import json
 import math
 import random
-from typing import List
-from fastapi import APIRouter, HTTPException, Query, Request, Response, status, Path
-from fastapi.responses import JSONResponse
+from typing import List, Literal, Optional
+import uuid
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Request, Response, status, Path
+from fastapi.responses import JSONResponse, StreamingResponse
 from app.models import Maps, Products, Persons, PersonMovements, Sales
 from app.dependencies import SessionDep
 from app.schemas import simulations as simulations_schemas
 from app.schemas import persons as persons_schemas
-from app.utils.simulations import main
-import aiohttp
-from app.models import Categories
+from app.utils.simulations import main, stream_simulation, generate_clients
+from app.utils.batch import run_batch
+from app.utils.store_models import store_model_cache, build_store_schema
+from app.utils.jobs import simulation_jobs, QueueFull, JOB_COMPLETED
+from app.utils.trajectories import results_to_format, results_to_npz
+from app.utils.heatmaps import encode_heatmap, decode_heatmap, rebucket_heatmap
+from app.utils.persistence import persist_simulation_json
 
 router_simulations = APIRouter(prefix="/simulations", tags=["Симуляции"])
 
 
+async def load_store_schema(session, map_id: int) -> dict:
+    map = await Maps.get_by_id(session, map_id)
+    if not map:
+        raise HTTPException(status_code=404, detail="Карта не найдена")
+    return build_store_schema(map)
+
+
 @router_simulations.post("/start")
 async def start_simulation(
+    session: SessionDep,
+    payload: simulations_schemas.SimulationCreate,
+    background_tasks: BackgroundTasks,
+):
+    json_data = await load_store_schema(session, payload.map_id)
+    model = store_model_cache.get(payload.map_id, json_data)
+    results = await main(payload.num_persons, json_data, model=model,
+                         trajectory_format=payload.trajectory_format,
+                         heatmap_bucket_seconds=payload.heatmap_bucket_seconds,
+                         route_order=payload.route_order,
+                         popular_zones_limit=payload.popular_zones_limit)
+    headers = {}
+    if payload.persist:
+        # Запись в БД идёт после отправки ответа; run_id прогона — в заголовке.
+        # main строит клиентов с seed 42 — те же профили сохраняются вместе с людьми
+        run_id = uuid.uuid4().hex
+        background_tasks.add_task(persist_simulation_json, payload.map_id, run_id, json_data, results,
+                                  generate_clients(payload.num_persons))
+        headers["X-Run-Id"] = run_id
+    # main уже вернул готовый JSON — отдаём его без повторного разбора и сериализации
+    return Response(content=results, media_type="application/json", headers=headers)
+
+
+@router_simulations.post("/stream")
+async def stream_simulation_results(
     session: SessionDep,
     payload: simulations_schemas.SimulationCreate
 ):
-    map = await Maps.get_by_id(session, payload.map_id)
-    if not map:
-        raise HTTPException(status_code=404, detail="Карта не найдена")
-    
-    json_data = None
-    async with aiohttp.ClientSession() as session_request:
-        async with session_request.get(f"http://localhost:8082/maps/{payload.map_id}/full") as response:
-            # Проверяем, что запрос успешен (HTTP 200)
-            if response.status == 200:
-                json_data = await response.json()
-            else:
-                raise Exception(f"Ошибка запроса: {response.status}")
-    if not json_data:
-        raise HTTPException(status_code=500, detail="Ошибка получения информации о мапе json_data")
-    
-    json_data['kasses'] = json_data['kassses']
-    categories_all = await Categories.get_all(session)
-    
-    list_category = []
-    for category in categories_all:
-        list_category.append({"name": category.name, "products": category.products})
-    results = await main(payload.num_persons, json_data, list_category)
-    return json.loads(results)
-    
\ No newline at end of file
+    """
+    Симуляция в потоковом режиме (NDJSON): по строке на каждого клиента
+    по мере завершения и итоговая строка со статистикой.
+    """
+    json_data = await load_store_schema(session, payload.map_id)
+    model = store_model_cache.get(payload.map_id, json_data)
+    # Синхронный генератор Starlette прогоняет в пуле потоков, не блокируя event loop
+    return StreamingResponse(
+        stream_simulation(payload.num_persons, json_data, model=model,
+                          trajectory_format=payload.trajectory_format,
+                          heatmap_bucket_seconds=payload.heatmap_bucket_seconds,
+                          route_order=payload.route_order,
+                          popular_zones_limit=payload.popular_zones_limit),
+        media_type="application/x-ndjson",
+    )
+
+
+@router_simulations.post("/batch")
+async def start_simulation_batch(
+    session: SessionDep,
+    payload: simulations_schemas.SimulationBatchCreate
+):
+    """
+    Серия независимых прогонов одной карты с разными seed в пуле процессов.
+    Возвращает средние, stddev и перцентили статистики, зон, стеллажей
+    и времени прогона; route_order позволяет сравнить порядки обхода.
+    """
+    json_data = await load_store_schema(session, payload.map_id)
+    return await run_batch(json_data, payload.num_persons, payload.replicas, seed=payload.seed,
+                           route_order=payload.route_order,
+                           popular_zones_limit=payload.popular_zones_limit)
+
+
+@router_simulations.get("/cache")
+async def get_store_model_cache():
+    """Состояние кэша скомпилированных моделей магазинов: размер, попадания, промахи."""
+    return store_model_cache.stats()
+
+
+@router_simulations.post("/submit", status_code=status.HTTP_202_ACCEPTED)
+async def submit_simulation(
+    session: SessionDep,
+    payload: simulations_schemas.SimulationCreate
+):
+    """
+    Ставит симуляцию в очередь и сразу возвращает run_id.
+    Статус и прогресс — GET /simulations/{run_id}, отчёт — с ?result=true.
+    """
+    json_data = await load_store_schema(session, payload.map_id)
+    try:
+        run_id = simulation_jobs.submit(payload.map_id, json_data, payload.num_persons,
+                                        persist=payload.persist,
+                                        trajectory_format=payload.trajectory_format,
+                                        heatmap_bucket_seconds=payload.heatmap_bucket_seconds,
+                                        route_order=payload.route_order,
+                                        popular_zones_limit=payload.popular_zones_limit)
+    except QueueFull:
+        raise HTTPException(status_code=429, detail="Очередь симуляций заполнена, повторите позже")
+    return {"run_id": run_id, "status": simulation_jobs.get(run_id)["status"]}
+
+
+@router_simulations.get("/{run_id}")
+async def get_simulation(
+    run_id: str,
+    result: bool = Query(False, title="Вернуть отчёт завершённой симуляции"),
+):
+    """
+    Статус и прогресс симуляции. Отчёт целиком — с result=true, траектории
+    и тепловая карта — отдельными запросами.
+    """
+    job = simulation_jobs.get(run_id, with_result=result)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Симуляция не найдена")
+    return job
+
+
+@router_simulations.get("/{run_id}/trajectories")
+async def get_simulation_trajectories(
+    run_id: str,
+    format: Literal["json", "compact", "npz"] = Query("compact", title="Формат траекторий"),
+):
+    """
+    Траектории клиентов завершённой симуляции: json — шаги словарями,
+    compact — дельты в base64, npz — один файл NumPy на весь прогон.
+    """
+    job = simulation_jobs.get(run_id, with_result=True)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Симуляция не найдена")
+    if job["status"] != JOB_COMPLETED:
+        raise HTTPException(status_code=409, detail="Симуляция ещё не завершена")
+    if job["result"] is None:
+        raise HTTPException(status_code=404, detail="Результат симуляции уже удалён")
+    results = job["result"]["results"]
+    if format == "npz":
+        return Response(
+            content=results_to_npz(results),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="trajectories_{run_id}.npz"'},
+        )
+    return [
+        {"client": r["client"], "status": r["status"], "path": r["path"]}
+        for r in results_to_format(results, format)
+    ]
+
+
+@router_simulations.get("/{run_id}/heatmap")
+async def get_simulation_heatmap(
+    run_id: str,
+    bucket_seconds: Optional[int] = Query(None, ge=1, title="Интервал, секунд (кратен интервалу прогона)"),
+    format: Literal["compact", "json"] = Query("compact", title="Формат тензора"),
+):
+    """
+    Посещения клеток завершённой симуляции по интервалам времени:
+    тензор (интервал, z, x). compact — разреженные индексы и значения
+    в base64, json — вложенные списки.
+    """
+    job = simulation_jobs.get(run_id, with_result=True)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Симуляция не найдена")
+    if job["status"] != JOB_COMPLETED:
+        raise HTTPException(status_code=409, detail="Симуляция ещё не завершена")
+    if job["result"] is None:
+        raise HTTPException(status_code=404, detail="Результат симуляции уже удалён")
+    heatmap = job["result"].get("heatmap")
+    if heatmap is None:
+        raise HTTPException(status_code=404, detail="Симуляция запущена без тепловой карты")
+    if bucket_seconds is None and format == "compact":
+        return heatmap
+    counts = decode_heatmap(heatmap)
+    run_bucket = heatmap["bucket_seconds"]
+    if bucket_seconds is not None:
+        if bucket_seconds % run_bucket:
+            raise HTTPException(status_code=422, detail=f"Интервал должен быть кратен {run_bucket} секундам")
+        counts = rebucket_heatmap(counts, bucket_seconds // run_bucket)
+    else:
+        bucket_seconds = run_bucket
+    if format == "json":
+        return {
+            "shape": list(counts.shape),
+            "bucket_seconds": bucket_seconds,
+            "start_time": heatmap["start_time"],
+            "counts": counts.tolist(),
+        }
+    return encode_heatmap(counts, bucket_seconds, heatmap["start_time"])
+
+
+@router_simulations.delete("/{run_id}", status_code=status.HTTP_202_ACCEPTED)
+async def cancel_simulation(run_id: str):
+    job = simulation_jobs.get(run_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Симуляция не найдена")
+    if not simulation_jobs.cancel(run_id):
+        raise HTTPException(status_code=409, detail="Симуляция уже завершена")
+    return {"run_id": run_id, "status": "cancelling"}
@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel, Field, EmailStr
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field, EmailStr, field_validator
 
 class SimulationCreate(BaseModel):
     map_id: int = Field(
@@ -14,5 +14,79 @@ class SimulationCreate(BaseModel):
         example=50,
         le=3000
     )
+    trajectory_format: Literal["json", "compact"] = Field(
+        "json",
+        title="Формат траекторий клиентов",
+        description="json — список шагов, compact — дельты координат int16 в base64",
+    )
+    heatmap_bucket_seconds: Optional[int] = Field(
+        None,
+        title="Интервал тепловой карты по времени, секунд",
+        description="По умолчанию (None) тепловая карта не считается; с интервалом в ответе появляется heatmap",
+        example=3600,
+        ge=60,
+        le=12 * 3600,
+    )
+    persist: bool = Field(
+        False,
+        title="Сохранить людей, перемещения и продажи прогона в БД",
+    )
+    route_order: Literal["list", "tsp"] = Field(
+        "list",
+        title="Порядок обхода списка покупок",
+        description="list — как в списке, tsp — кратчайший маршрут по стеллажам (ближайший сосед + 2-opt)",
+    )
+    popular_zones_limit: Optional[int] = Field(
+        None,
+        title="Сколько самых посещаемых клеток вернуть в popular_zones",
+        description="None — все посещённые клетки",
+        example=50,
+        ge=1,
+    )
     
-    
\ No newline at end of file
+    
+
+class SimulationBatchCreate(BaseModel):
+    map_id: int = Field(
+        ...,
+        title="Идентификатор карты",
+        example=1,
+    )
+    num_persons: List[int] = Field(
+        ...,
+        title="Количество человек в каждой серии прогонов",
+        example=[100, 500],
+        min_length=1,
+        max_length=10,
+    )
+    replicas: int = Field(
+        10,
+        title="Количество прогонов на каждое значение num_persons",
+        example=10,
+        ge=1,
+        le=100,
+    )
+    seed: int = Field(
+        42,
+        title="Seed первого прогона",
+        example=42,
+    )
+    route_order: Literal["list", "tsp"] = Field(
+        "list",
+        title="Порядок обхода списка покупок",
+        description="list — как в списке, tsp — кратчайший маршрут по стеллажам (ближайший сосед + 2-opt)",
+    )
+    popular_zones_limit: Optional[int] = Field(
+        None,
+        title="Сколько самых посещаемых клеток вернуть в popular_zones",
+        description="None — все посещённые клетки",
+        example=50,
+        ge=1,
+    )
+
+    @field_validator("num_persons")
+    @classmethod
+    def check_num_persons(cls, value):
+        if any(n < 1 or n > 3000 for n in value):
+            raise ValueError("num_persons должно быть от 1 до 3000")
+        return value
@@ -0,0 +1,139 @@
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.utils.simulations import StoreModel, generate_clients
+from app.utils.event_simulation import EventDrivenSimulation
+from app.utils.queues import KASSA_METRICS
+
+# Перцентили, которые считаются для каждой метрики
+BATCH_PERCENTILES = (5, 50, 95)
+
+# Схема и скомпилированная модель магазина процесса-воркера (строятся один раз в initializer)
+_worker_store_schema = None
+_worker_store_model = None
+
+
+def _init_worker(store_schema):
+    global _worker_store_schema, _worker_store_model
+    _worker_store_schema = store_schema
+    _worker_store_model = StoreModel(store_schema)
+
+
+def run_replica(seed, num_persons, store_schema=None, route_order="list", popular_zones_limit=None):
+    """Один прогон симуляции с детерминированным seed."""
+    random.seed(seed)
+    np.random.seed(seed)
+    clients = generate_clients(num_persons, seed)
+    if store_schema is not None:
+        sim = EventDrivenSimulation(store_schema, route_order=route_order, popular_zones_limit=popular_zones_limit)
+    else:
+        sim = EventDrivenSimulation(_worker_store_schema, model=_worker_store_model, route_order=route_order,
+                                    popular_zones_limit=popular_zones_limit)
+    started = time.perf_counter()
+    report = sim.run(clients)
+    run_time = time.perf_counter() - started
+    # Пути клиентов не нужны для агрегатов и дорого передаются между процессами
+    return {
+        "seed": seed,
+        "num_persons": num_persons,
+        "run_time": run_time,
+        "statistics": report["statistics"],
+        "popular_zones": report["popular_zones"],
+        "shelf_statistics": report["shelf_statistics"],
+        "kassa_statistics": report["kassa_statistics"],
+    }
+
+
+def summarize(values):
+    values = np.asarray(values, dtype=float)
+    summary = {
+        "mean": float(values.mean()),
+        "std": float(values.std(ddof=1)) if len(values) > 1 else 0.0,
+        "min": float(values.min()),
+        "max": float(values.max()),
+    }
+    for q, value in zip(BATCH_PERCENTILES, np.percentile(values, BATCH_PERCENTILES)):
+        summary[f"p{q}"] = float(value)
+    return summary
+
+
+def aggregate_replicas(replicas):
+    """Сводит прогоны с одинаковым num_persons в средние, stddev и перцентили."""
+    statistics = {
+        key: summarize([r["statistics"][key] for r in replicas])
+        for key in replicas[0]["statistics"]
+    }
+
+    # Клетка, в которую не зашли или которая не попала в popular_zones_limit
+    # в каком-то прогоне, считается с нулём посещений
+    zone_visits = defaultdict(lambda: np.zeros(len(replicas)))
+    for i, replica in enumerate(replicas):
+        for zone in replica["popular_zones"]:
+            zone_visits[(zone["x"], zone["z"])][i] = zone["visits"]
+    popular_zones = [
+        {"x": x, "z": z, "visits": summarize(visits)}
+        for (x, z), visits in zone_visits.items()
+    ]
+    popular_zones.sort(key=lambda d: d["visits"]["mean"], reverse=True)
+
+    shelf_statistics = {}
+    for key, shelf in replicas[0]["shelf_statistics"].items():
+        shelf_statistics[key] = {
+            "category": shelf["category"],
+            "cells": shelf["cells"],
+        }
+        for metric in ("visits", "purchases", "conversion_rate"):
+            shelf_statistics[key][metric] = summarize([r["shelf_statistics"][key][metric] for r in replicas])
+
+    kassa_statistics = []
+    for i, kassa in enumerate(replicas[0]["kassa_statistics"]):
+        summary = {"kassa": kassa["kassa"], "x": kassa["x"], "z": kassa["z"]}
+        for metric in KASSA_METRICS:
+            summary[metric] = summarize([r["kassa_statistics"][i][metric] for r in replicas])
+        kassa_statistics.append(summary)
+
+    return {
+        "replicas": len(replicas),
+        "seeds": [r["seed"] for r in replicas],
+        "run_time": summarize([r["run_time"] for r in replicas]),
+        "statistics": statistics,
+        "popular_zones": popular_zones,
+        "shelf_statistics": shelf_statistics,
+        "kassa_statistics": kassa_statistics,
+    }
+
+
+async def run_batch(store_schema, num_persons_list, replicas, seed=42, max_workers=None, route_order="list",
+                    popular_zones_limit=None):
+    """
+    Запускает replicas прогонов для каждого значения num_persons в пуле процессов.
+    Seed прогона i — seed + i, одинаковый для всех num_persons, поэтому серии
+    с разным route_order сравнимы по статистике и времени прогона (run_time).
+    """
+    loop = asyncio.get_running_loop()
+    max_workers = max_workers or os.cpu_count() or 1
+    num_persons_list = list(dict.fromkeys(num_persons_list))
+    tasks = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(store_schema,)) as pool:
+        for num_persons in num_persons_list:
+            for i in range(replicas):
+                tasks.append(loop.run_in_executor(pool, run_replica, seed + i, num_persons,
+                                                  None, route_order, popular_zones_limit))
+        results = await asyncio.gather(*tasks)
+
+    by_persons = defaultdict(list)
+    for result in results:
+        by_persons[result["num_persons"]].append(result)
+    return {
+        "route_order": route_order,
+        "batches": [
+            {"num_persons": num_persons, **aggregate_replicas(by_persons[num_persons])}
+            for num_persons in num_persons_list
+        ]
+    }
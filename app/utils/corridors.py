@@ -0,0 +1,162 @@
+import heapq
+
+import numpy as np
+
+
+####################################
+#          Граф проходов          #
+####################################
+class CorridorGraph:
+    """
+    Сжатый граф проходов магазина для дальних маршрутов.
+
+    Узлы — свободные клетки на пересечениях «критических» столбцов и строк:
+    там, где по соседству начинается или заканчивается препятствие, и по
+    краям карты. Рёбра — прямые свободные отрезки между соседними узлами,
+    длина ребра — число шагов. Кратчайший путь по клеткам всегда можно
+    уложить на такие линии вместе со строкой и столбцом старта и цели
+    (сетка Ханана), поэтому A* по графу даёт путь той же длины, что BFS
+    по клеткам, но раскрывает перекрёстки, а не каждую клетку прохода.
+
+    Строится один раз на планировку по статическим препятствиям; другие
+    клиенты учитываются уже на уровне клеток (см. StoreSimulation.find_path).
+    Свободность отрезка проверяется префиксными суммами за O(1).
+    """
+
+    def __init__(self, grid_width, grid_height, obstacles):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        blocked = np.asarray(obstacles, dtype=bool).reshape(grid_height, grid_width)
+        # row_prefix[z][x] — число препятствий в строке z левее x, col_prefix[x][z] — в столбце x выше z
+        row_prefix = np.zeros((grid_height, grid_width + 1), dtype=np.int64)
+        row_prefix[:, 1:] = np.cumsum(blocked, axis=1)
+        col_prefix = np.zeros((grid_width, grid_height + 1), dtype=np.int64)
+        col_prefix[:, 1:] = np.cumsum(blocked.T, axis=1)
+        # Списки быстрее numpy при поштучном доступе из цикла поиска
+        self.row_prefix = row_prefix.tolist()
+        self.col_prefix = col_prefix.tolist()
+        self.xs = self._critical_lines(blocked, grid_width)
+        self.zs = self._critical_lines(blocked.T, grid_height)
+
+    @staticmethod
+    def _critical_lines(blocked, size):
+        # Столбцы по обе стороны от каждой смены свободно/занято в какой-либо строке
+        changes = np.flatnonzero((blocked[:, 1:] != blocked[:, :-1]).any(axis=0))
+        lines = {0, size - 1}
+        lines.update(changes.tolist())
+        lines.update((changes + 1).tolist())
+        return sorted(lines)
+
+    @property
+    def node_count(self):
+        return len(self.xs) * len(self.zs)
+
+    def is_blocked(self, x, z):
+        return self.row_prefix[z][x + 1] != self.row_prefix[z][x]
+
+    def _row_obstacles(self, z, x1, x2):
+        if x1 > x2:
+            x1, x2 = x2, x1
+        row = self.row_prefix[z]
+        return row[x2 + 1] - row[x1]
+
+    def _col_obstacles(self, x, z1, z2):
+        if z1 > z2:
+            z1, z2 = z2, z1
+        col = self.col_prefix[x]
+        return col[z2 + 1] - col[z1]
+
+    def path(self, start, goal, stats=None):
+        """
+        Кратчайший путь по клеткам от start до goal без учёта других
+        клиентов. Как и bfs_path, старт и цель могут быть препятствиями
+        (клиент у стеллажа, стеллаж или касса как цель). None — пути нет.
+        """
+        if start == goal:
+            return [start]
+        sx, sz = int(start[0]), int(start[1])
+        gx, gz = int(goal[0]), int(goal[1])
+        w, h = self.grid_width, self.grid_height
+        if not (0 <= sx < w and 0 <= sz < h and 0 <= gx < w and 0 <= gz < h):
+            return None
+        xs = sorted(set(self.xs) | {sx, gx})
+        zs = sorted(set(self.zs) | {sz, gz})
+        x_index = {x: i for i, x in enumerate(xs)}
+        z_index = {z: i for i, z in enumerate(zs)}
+        s = (sx, sz)
+        g = (gx, gz)
+        start_blocked = int(self.is_blocked(sx, sz))
+        goal_blocked = int(self.is_blocked(gx, gz))
+
+        g_score = {s: 0}
+        parents = {}
+        counter = 0
+        heap = [(abs(sx - gx) + abs(sz - gz), 0, counter, s)]
+        closed = set()
+        expansions = 0
+        found = False
+        while heap:
+            _, neg_g, _, node = heapq.heappop(heap)
+            if node == g:
+                found = True
+                break
+            if node in closed:
+                continue
+            closed.add(node)
+            expansions += 1
+            cost = -neg_g
+            x, z = node
+            i = x_index[x]
+            j = z_index[z]
+            for k in (i - 1, i + 1):
+                if not 0 <= k < len(xs):
+                    continue
+                nx = xs[k]
+                obstacles = self._row_obstacles(z, x, nx) - (start_blocked if node == s else 0)
+                self._relax(node, (nx, z), cost + abs(nx - x), obstacles, g, goal_blocked,
+                            g_score, parents, closed, heap, counter)
+                counter += 1
+            for k in (j - 1, j + 1):
+                if not 0 <= k < len(zs):
+                    continue
+                nz = zs[k]
+                obstacles = self._col_obstacles(x, z, nz) - (start_blocked if node == s else 0)
+                self._relax(node, (x, nz), cost + abs(nz - z), obstacles, g, goal_blocked,
+                            g_score, parents, closed, heap, counter)
+                counter += 1
+        if stats is not None:
+            stats["path_expansions"] += expansions
+        if not found:
+            return None
+        nodes = [g]
+        while nodes[-1] != s:
+            nodes.append(parents[nodes[-1]])
+        nodes.reverse()
+        return self._expand(nodes, start, goal)
+
+    @staticmethod
+    def _relax(node, nxt, cost, obstacles, goal, goal_blocked, g_score, parents, closed, heap, counter):
+        if nxt == goal:
+            obstacles -= goal_blocked
+        if obstacles or nxt in closed:
+            return
+        if cost < g_score.get(nxt, cost + 1):
+            g_score[nxt] = cost
+            parents[nxt] = node
+            h = abs(nxt[0] - goal[0]) + abs(nxt[1] - goal[1])
+            # При равных f раскрываем более глубокие узлы, как astar_path
+            heapq.heappush(heap, (cost + h, -cost, counter, nxt))
+
+    @staticmethod
+    def _expand(nodes, start, goal):
+        """Раскладывает ломаную по узлам в последовательность клеток."""
+        cells = [start]
+        for (x1, z1), (x2, z2) in zip(nodes, nodes[1:]):
+            if x1 != x2:
+                step = 1 if x2 > x1 else -1
+                cells.extend((x, z1) for x in range(x1 + step, x2 + step, step))
+            else:
+                step = 1 if z2 > z1 else -1
+                cells.extend((x1, z) for z in range(z1 + step, z2 + step, step))
+        cells[-1] = goal
+        return cells
@@ -0,0 +1,216 @@
+import heapq
+import random
+from collections import Counter
+
+from app.utils.simulations import (
+    StoreSimulation,
+    BLOCK_TIME_SECONDS,
+    OPEN_TIME_SECONDS,
+    CLOSE_TIME_SECONDS,
+    QUEUE_SERVICE_TIME,
+    KASSA_BREAK_PROB,
+    KASSA_REPAIR_TIME,
+    SERVICE_TIME_PER_ITEM,
+)
+from app.utils.queues import KassaQueue
+
+# Сколько шагов клиент готов простоять, если обойти занятую клетку нельзя
+MAX_BLOCKED_WAITS = 10
+
+# Типы событий планировщика
+EVENT_ARRIVAL = "arrival"
+EVENT_STEP = "step"
+EVENT_SHELF_ARRIVAL = "shelf_arrival"
+EVENT_QUEUE_JOIN = "queue_join"
+EVENT_CHECKOUT = "checkout"
+EVENT_KASSA_BREAKDOWN = "kassa_breakdown"
+EVENT_KASSA_REPAIR = "kassa_repair"
+
+
+class EventDrivenSimulation(StoreSimulation):
+    """
+    Дискретно-событийная симуляция магазина.
+
+    Каждый клиент — генератор-процесс, который отдаёт планировщику
+    (тип события, время следующего пробуждения). Очередь событий —
+    куча по модельному времени, клиенты чередуются пошагово и без
+    реальных asyncio.sleep, поэтому прогон идёт со скоростью CPU.
+    Формат результата совпадает с StoreSimulation.simulate_clients,
+    плюс kassa_statistics: загрузка касс и перцентили ожидания.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.event_counts = Counter()
+        self.events = []
+        self.event_seq = 0
+        # Очередь кассы живёт между клиентами; choose_kassa смотрит на её длину через self.queues
+        self.kassa_queues = [KassaQueue(i, kassa) for i, kassa in enumerate(self.kasses)]
+        self.queues = [kassa.waiting for kassa in self.kassa_queues]
+
+    def run(self, clients):
+        results = list(self.iter_results(clients))
+        return self.build_report(len(clients), results)
+
+    async def simulate_clients(self, clients):
+        return self.run(clients)
+
+    def iter_results(self, clients):
+        """Прогоняет день и отдаёт результаты клиентов по мере их завершения."""
+        self.prepare_clients(clients)
+        for client in self.assign_arrival_times(clients):
+            self.schedule(self.client_process(client), client['arrival_time'], EVENT_ARRIVAL)
+        heap = self.events
+        while heap:
+            _, _, kind, process = heapq.heappop(heap)
+            self.event_counts[kind] += 1
+            try:
+                kind, wake_time = next(process)
+            except StopIteration as finished:
+                # Процессы поломок касс результата не возвращают
+                if finished.value is not None:
+                    yield finished.value
+                continue
+            self.schedule(process, wake_time, kind)
+
+    def schedule(self, process, wake_time, kind):
+        heapq.heappush(self.events, (wake_time, self.event_seq, kind, process))
+        self.event_seq += 1
+
+    def build_report(self, total_clients, results):
+        report = super().build_report(total_clients, results)
+        report["kassa_statistics"] = [
+            kassa.statistics(OPEN_TIME_SECONDS, CLOSE_TIME_SECONDS) for kassa in self.kassa_queues
+        ]
+        return report
+
+    def enter_cell(self, cell):
+        self.current_occupied.add(cell)
+
+    def leave_cell(self, cell):
+        # Стеллажи и кассы остаются препятствиями, даже когда клиент от них отходит
+        if cell not in self.base_occupied_positions:
+            self.current_occupied.discard(cell)
+
+    def walk(self, path_cells, position, current_time, path_log):
+        """
+        Процесс движения по пути: одно событие step на клетку.
+        Возвращает (позиция, время, статус) через yield from.
+        """
+        destination = path_cells[-1]
+        i = 1
+        waits = 0
+        while i < len(path_cells):
+            current_time += BLOCK_TIME_SECONDS
+            yield EVENT_STEP, current_time
+            next_cell = path_cells[i]
+            if next_cell != destination and next_cell in self.current_occupied:
+                new_path = self.replan(path_cells, i, position)
+                if not new_path or len(new_path) < 2:
+                    # Обойти нельзя — стоим на месте и пробуем на следующем шаге
+                    waits += 1
+                    if waits > MAX_BLOCKED_WAITS:
+                        return position, current_time, "no_path"
+                    continue
+                path_cells = new_path
+                i = 1
+                next_cell = path_cells[1]
+            waits = 0
+            self.leave_cell(position)
+            position = next_cell
+            self.enter_cell(position)
+            path_log.append({"x": position[0], "z": position[1], "time": current_time})
+            self.cell_visits.visit(position, current_time)
+            if current_time > CLOSE_TIME_SECONDS:
+                return position, current_time, "store_closed"
+            i += 1
+        return position, current_time, "ok"
+
+    def client_process(self, client):
+        current_time = client['arrival_time']
+        status = "completed"
+        path_log = []
+        purchases_log = []
+        position = self.find_start_position()
+        if position is None:
+            self.global_stats["no_start_position"] += 1
+            return {"client": client['name'], "path": self.finish_path(path_log), "purchases": purchases_log, "end_time": current_time, "status": "no_start_position"}
+        self.enter_cell(position)
+        path_log.append({"x": position[0], "z": position[1], "time": current_time, "event": "entered_store"})
+        self.cell_visits.visit(position, current_time)
+
+        for item in self.plan_route(client, position):
+            if current_time > CLOSE_TIME_SECONDS:
+                status = "store_closed"
+                self.global_stats["store_closed"] += 1
+                break
+            decision = self.evaluate_item(client, item)
+            if decision is None:
+                continue
+            cat, shelf_cells, product_info, chance = decision
+            path_cells = self.find_path(position, shelf_cells[0])
+            if not path_cells:
+                status = "no_path_to_shelf"
+                self.global_stats["no_path_to_shelf"] += 1
+                break
+            position, current_time, st = yield from self.walk(path_cells, position, current_time, path_log)
+            if st in ("store_closed", "no_path") or current_time > CLOSE_TIME_SECONDS:
+                status = "store_closed" if current_time > CLOSE_TIME_SECONDS else "no_path_to_shelf"
+                self.global_stats[status] += 1
+                break
+            yield EVENT_SHELF_ARRIVAL, current_time
+            self.visit_shelf(item, cat, shelf_cells, chance, position, current_time, path_log, purchases_log)
+
+        if status == "completed":
+            status, position, current_time = yield from self.checkout(client, position, current_time, path_log,
+                                                                      purchases_log)
+
+        self.leave_cell(position)
+        if status == "completed":
+            self.global_stats["completed"] += 1
+        return {"client": client['name'], "path": self.finish_path(path_log), "purchases": purchases_log, "end_time": current_time, "status": status}
+
+    def checkout(self, client, position, current_time, path_log, purchases_log):
+        chosen_kassa = self.choose_kassa(position)
+        if chosen_kassa is None:
+            self.global_stats["no_kassa"] += 1
+            return "no_kassa", position, current_time
+        path_cells = self.find_path(position, self.kasses[chosen_kassa])
+        if not path_cells:
+            self.global_stats["no_path_to_kassa"] += 1
+            return "no_path_to_kassa", position, current_time
+        position, current_time, st = yield from self.walk(path_cells, position, current_time, path_log)
+        if st == "no_path":
+            self.global_stats["no_path_to_kassa"] += 1
+            return "no_path_to_kassa", position, current_time
+        if st == "store_closed" or current_time > CLOSE_TIME_SECONDS:
+            self.global_stats["store_closed"] += 1
+            return "store_closed", position, current_time
+        yield EVENT_QUEUE_JOIN, current_time
+        # Длину очереди клиент оценивает, уже подойдя к кассе
+        kassa = self.kassa_queues[chosen_kassa]
+        if len(kassa) >= self.max_queue_length:
+            kassa.balk()
+            self.global_stats["left_due_to_queue"] += 1
+            return "left_due_to_queue", position, current_time
+        items = sum(1 for purchase in purchases_log if purchase["purchased"])
+        service_time = QUEUE_SERVICE_TIME + SERVICE_TIME_PER_ITEM * items
+        repair_time = KASSA_REPAIR_TIME if random.random() < KASSA_BREAK_PROB else 0.0
+        start, finish, broken_at = kassa.join(client['name'], current_time, service_time, repair_time)
+        if broken_at is not None:
+            self.global_stats["kassa_breakdowns"] += 1
+            path_log.append({"x": position[0], "z": position[1], "time": broken_at, "event": "kassa_broken"})
+            self.schedule(self.kassa_repair(start), broken_at, EVENT_KASSA_BREAKDOWN)
+        # Клиент стоит в очереди до конца своего обслуживания
+        current_time = finish
+        yield EVENT_CHECKOUT, current_time
+        kassa.leave()
+        path_log.append({"x": position[0], "z": position[1], "time": current_time, "event": f"finished queue at Kassa {chosen_kassa+1}"})
+        if current_time > CLOSE_TIME_SECONDS:
+            self.global_stats["store_closed"] += 1
+            return "store_closed", position, current_time
+        return "completed", position, current_time
+
+    def kassa_repair(self, repaired_at):
+        """Процесс поломки кассы: событие поломки при запуске, затем ремонт."""
+        yield EVENT_KASSA_REPAIR, repaired_at
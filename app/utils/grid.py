@@ -0,0 +1,372 @@
+import numpy as np
+
+# Начиная с такого числа клеток BFS идёт слоями через numpy,
+# на маленьких картах быстрее скалярный обход по плоским индексам
+VECTORIZED_BFS_MIN_CELLS = 40_000
+
+
+def grid_bounds(store_schema):
+    """
+    Размер сетки (ширина, высота) по карте: x/z карты, расширенные до
+    дальних клеток стеллажей и касс, чтобы планировка не обрезалась.
+    """
+    width = int(store_schema.get("x") or 0)
+    height = int(store_schema.get("z") or 0)
+    for shelf in store_schema.get("shelves", []):
+        width = max(width, int(shelf["x"]) + shelf.get("width", 3))
+        height = max(height, int(shelf["z"]) + shelf.get("depth", 1))
+    for kassa in store_schema.get("kasses", []):
+        width = max(width, int(kassa["x"]) + 1)
+        height = max(height, int(kassa["z"]) + 1)
+    return max(width, 1), max(height, 1)
+
+
+####################################
+#        Сетка занятости          #
+####################################
+class OccupancyGrid:
+    """
+    Занятость клеток магазина в виде плоского массива uint8 размера
+    grid_width * grid_height (индекс клетки = z * grid_width + x).
+
+    Поддерживает операции множества (`in`, add, remove, discard), поэтому
+    может подменять `current_occupied` в StoreSimulation. Буферы поиска
+    пути (родители, метки посещения) выделяются один раз и переиспользуются.
+    """
+
+    def __init__(self, grid_width, grid_height, occupied=()):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.size = grid_width * grid_height
+        # bytearray даёт быстрый доступ из цикла, numpy-представление — векторные операции
+        self.cells = bytearray(self.size)
+        self.array = np.frombuffer(self.cells, dtype=np.uint8)
+        # Клетки за пределами сетки храним отдельно, как это делает множество
+        self.outside = set()
+        for pos in occupied:
+            self.add(pos)
+        self._neighbors = None
+        self._parents = None
+        self._visited = None
+        self._stamp = 0
+        # Счётчик раскрытых клеток за всё время жизни сетки
+        self.expansions = 0
+
+    def copy(self):
+        grid = OccupancyGrid.__new__(OccupancyGrid)
+        grid.grid_width = self.grid_width
+        grid.grid_height = self.grid_height
+        grid.size = self.size
+        grid.cells = bytearray(self.cells)
+        grid.array = np.frombuffer(grid.cells, dtype=np.uint8)
+        grid.outside = set(self.outside)
+        # Таблица соседей не меняется, её можно разделять между копиями
+        grid._neighbors = self._neighbors
+        grid._parents = None
+        grid._visited = None
+        grid._stamp = 0
+        grid.expansions = 0
+        return grid
+
+    def index(self, pos):
+        x, z = int(pos[0]), int(pos[1])
+        if 0 <= x < self.grid_width and 0 <= z < self.grid_height:
+            return z * self.grid_width + x
+        return -1
+
+    def position(self, idx):
+        return (idx % self.grid_width, idx // self.grid_width)
+
+    def __contains__(self, pos):
+        idx = self.index(pos)
+        if idx < 0:
+            return pos in self.outside
+        return self.cells[idx] == 1
+
+    def add(self, pos):
+        idx = self.index(pos)
+        if idx < 0:
+            self.outside.add(pos)
+        else:
+            self.cells[idx] = 1
+
+    def remove(self, pos):
+        idx = self.index(pos)
+        if idx < 0:
+            self.outside.remove(pos)
+        elif not self.cells[idx]:
+            raise KeyError(pos)
+        else:
+            self.cells[idx] = 0
+
+    def discard(self, pos):
+        idx = self.index(pos)
+        if idx < 0:
+            self.outside.discard(pos)
+        else:
+            self.cells[idx] = 0
+
+    def _next_stamp(self):
+        self._stamp += 1
+        return self._stamp
+
+    def _build_neighbors(self):
+        # Порядок соседей совпадает с bfs_path: (1, 0), (-1, 0), (0, 1), (0, -1)
+        w, h = self.grid_width, self.grid_height
+        neighbors = []
+        for idx in range(self.size):
+            x, z = idx % w, idx // w
+            cell = []
+            if x < w - 1:
+                cell.append(idx + 1)
+            if x > 0:
+                cell.append(idx - 1)
+            if z < h - 1:
+                cell.append(idx + w)
+            if z > 0:
+                cell.append(idx - w)
+            neighbors.append(tuple(cell))
+        return neighbors
+
+    def bfs_path(self, start, end):
+        """
+        Поиск кратчайшего пути по плоским индексам. Результат совпадает
+        с bfs_path(...) для множества занятых клеток: конечная клетка
+        достижима, даже если она занята (стеллаж, касса).
+        """
+        if start == end:
+            return [start]
+        s = self.index(start)
+        e = self.index(end)
+        if s < 0 or e < 0:
+            return None
+        if self.size >= VECTORIZED_BFS_MIN_CELLS:
+            found = self._bfs_layers(s, e)
+        else:
+            found = self._bfs_scalar(s, e)
+        if not found:
+            return None
+        return self._build_path(start, end, s, e)
+
+    def _bfs_scalar(self, s, e):
+        if self._neighbors is None:
+            self._neighbors = self._build_neighbors()
+        if self._visited is None or isinstance(self._visited, np.ndarray):
+            self._visited = [0] * self.size
+            self._parents = [0] * self.size
+        neighbors = self._neighbors
+        visited = self._visited
+        parents = self._parents
+        cells = self.cells
+        stamp = self._next_stamp()
+        visited[s] = stamp
+        queue = [s]
+        head = 0
+        while head < len(queue):
+            cur = queue[head]
+            head += 1
+            self.expansions += 1
+            for nxt in neighbors[cur]:
+                if nxt == e:
+                    parents[e] = cur
+                    return True
+                if visited[nxt] != stamp and not cells[nxt]:
+                    visited[nxt] = stamp
+                    parents[nxt] = cur
+                    queue.append(nxt)
+        return False
+
+    def _bfs_layers(self, s, e):
+        if not isinstance(self._visited, np.ndarray):
+            self._visited = np.zeros(self.size, dtype=np.uint32)
+            self._parents = np.zeros(self.size, dtype=np.int64)
+        w, h = self.grid_width, self.grid_height
+        visited = self._visited
+        parents = self._parents
+        stamp = self._next_stamp()
+        visited[s] = stamp
+        frontier = np.array([s], dtype=np.int64)
+        while frontier.size:
+            self.expansions += int(frontier.size)
+            xs = frontier % w
+            zs = frontier // w
+            cand = np.stack([frontier + 1, frontier - 1, frontier + w, frontier - w], axis=1)
+            valid = np.stack([xs < w - 1, xs > 0, zs < h - 1, zs > 0], axis=1)
+            hit = valid & (cand == e)
+            if hit.any():
+                # Первое попадание в порядке обхода очереди — как в скалярном BFS
+                k = int(np.flatnonzero(hit)[0])
+                parents[e] = frontier[k // 4]
+                return True
+            owners = np.broadcast_to(frontier[:, None], cand.shape)[valid]
+            cand = cand[valid]
+            free = (visited[cand] != stamp) & (self.array[cand] == 0)
+            cand = cand[free]
+            owners = owners[free]
+            # Клетка достаётся первому родителю в порядке очереди
+            _, first = np.unique(cand, return_index=True)
+            first.sort()
+            frontier = cand[first]
+            parents[frontier] = owners[first]
+            visited[frontier] = stamp
+        return False
+
+    def _build_path(self, start, end, s, e):
+        parents = self._parents
+        path = [end]
+        cur = int(parents[e])
+        while cur != s:
+            path.append(self.position(cur))
+            cur = int(parents[cur])
+        path.append(start)
+        path.reverse()
+        return path
+
+
+####################################
+#       Статические поля          #
+####################################
+def obstacle_mask(grid_width, grid_height, positions):
+    """Плоская маска статических препятствий (стеллажи, кассы)."""
+    mask = np.zeros(grid_width * grid_height, dtype=bool)
+    for x, z in positions:
+        x, z = int(x), int(z)
+        if 0 <= x < grid_width and 0 <= z < grid_height:
+            mask[z * grid_width + x] = True
+    return mask
+
+
+class DistanceField:
+    """
+    Поле расстояний до одной цели на статической карте препятствий.
+
+    Считается обратным BFS от цели один раз; путь из любой клетки
+    восстанавливается спуском по градиенту за O(длины пути).
+    """
+
+    def __init__(self, grid_width, grid_height, obstacles, target):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.target = target
+        self.dist = np.full(grid_width * grid_height, -1, dtype=np.int32)
+        x, z = int(target[0]), int(target[1])
+        if 0 <= x < grid_width and 0 <= z < grid_height:
+            self._fill(obstacles, z * grid_width + x)
+
+    def _fill(self, obstacles, t):
+        w, h = self.grid_width, self.grid_height
+        dist = self.dist
+        dist[t] = 0
+        frontier = np.array([t], dtype=np.int64)
+        d = 0
+        while frontier.size:
+            d += 1
+            xs = frontier % w
+            zs = frontier // w
+            cand = np.concatenate([
+                frontier[xs < w - 1] + 1,
+                frontier[xs > 0] - 1,
+                frontier[zs < h - 1] + w,
+                frontier[zs > 0] - w,
+            ])
+            cand = cand[(dist[cand] < 0) & ~obstacles[cand]]
+            frontier = np.unique(cand)
+            dist[frontier] = d
+
+    def _neighbors(self, idx):
+        w = self.grid_width
+        x, z = idx % w, idx // w
+        if x < w - 1:
+            yield idx + 1
+        if x > 0:
+            yield idx - 1
+        if z < self.grid_height - 1:
+            yield idx + w
+        if z > 0:
+            yield idx - w
+
+    def distance(self, pos):
+        """Число шагов до цели или None, если цель недостижима."""
+        if pos == self.target:
+            return 0
+        x, z = int(pos[0]), int(pos[1])
+        if not (0 <= x < self.grid_width and 0 <= z < self.grid_height):
+            return None
+        idx = z * self.grid_width + x
+        d = int(self.dist[idx])
+        if d >= 0:
+            return d
+        # Стартовая клетка — препятствие (клиент стоит у стеллажа): выходим через соседа
+        best = None
+        for nxt in self._neighbors(idx):
+            nd = int(self.dist[nxt])
+            if nd >= 0 and (best is None or nd < best):
+                best = nd
+        return None if best is None else best + 1
+
+    def path_from(self, start):
+        if start == self.target:
+            return [start]
+        x, z = int(start[0]), int(start[1])
+        w = self.grid_width
+        if not (0 <= x < w and 0 <= z < self.grid_height):
+            return None
+        dist = self.dist
+        cur = z * w + x
+        path = [start]
+        if dist[cur] < 0:
+            best = None
+            for nxt in self._neighbors(cur):
+                if dist[nxt] >= 0 and (best is None or dist[nxt] < dist[best]):
+                    best = nxt
+            if best is None:
+                return None
+            cur = best
+            if dist[cur] > 0:
+                path.append((cur % w, cur // w))
+        while dist[cur] > 0:
+            step = dist[cur] - 1
+            for nxt in self._neighbors(cur):
+                if dist[nxt] == step:
+                    cur = nxt
+                    break
+            if dist[cur] > 0:
+                path.append((cur % w, cur // w))
+        path.append(self.target)
+        return path
+
+
+class DistanceFields:
+    """
+    Поля расстояний до стеллажей и касс, которые строятся при первом
+    обращении к цели и дальше переиспользуются. На больших картах поле —
+    это W·H int32 на цель, а клиенты прогона ходят не ко всем стеллажам.
+    """
+
+    def __init__(self, grid_width, grid_height, obstacles, targets):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.obstacles = obstacles
+        self.targets = set(targets)
+        self.fields = {}
+
+    def __contains__(self, target):
+        return target in self.targets
+
+    def __len__(self):
+        return len(self.targets)
+
+    def get(self, target, default=None):
+        if target not in self.targets:
+            return default
+        field = self.fields.get(target)
+        if field is None:
+            field = DistanceField(self.grid_width, self.grid_height, self.obstacles, target)
+            self.fields[target] = field
+        return field
+
+    def __getitem__(self, target):
+        field = self.get(target)
+        if field is None:
+            raise KeyError(target)
+        return field
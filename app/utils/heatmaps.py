@@ -0,0 +1,223 @@
+import base64
+import math
+from collections import defaultdict
+
+import numpy as np
+
+
+####################################
+#        Счётчики по клеткам      #
+####################################
+class CellCounter:
+    """
+    Счётчик по клеткам сетки в предвыделенном массиве counts[z, x].
+
+    Повторяет интерфейс defaultdict(int) с ключами (x, z): counter[pos] += 1,
+    get, items. Клетки за пределами сетки хранятся отдельно в словаре.
+    Порядок первого посещения клеток хранится в first_seen, чтобы top
+    отдавал равные счётчики в том же порядке, что и словарь.
+    """
+
+    def __init__(self, grid_width, grid_height, timeline=None):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.counts = np.zeros((grid_height, grid_width), dtype=np.int64)
+        # Плоское представление того же буфера: индекс клетки = z * grid_width + x
+        self.flat = self.counts.reshape(-1)
+        self.outside = defaultdict(int)
+        # Номер первого посещения клетки (-1 — не посещалась), общий для сетки и outside
+        self.first_seen = np.full(self.flat.size, -1, dtype=np.int64)
+        self.outside_seen = {}
+        self.seen_count = 0
+        # Необязательная разбивка тех же посещений по интервалам времени
+        self.timeline = timeline
+
+    def index(self, pos):
+        x, z = int(pos[0]), int(pos[1])
+        if 0 <= x < self.grid_width and 0 <= z < self.grid_height:
+            return z * self.grid_width + x
+        return -1
+
+    def __getitem__(self, pos):
+        idx = self.index(pos)
+        if idx < 0:
+            return self.outside[pos]
+        return int(self.flat[idx])
+
+    def __setitem__(self, pos, value):
+        idx = self.index(pos)
+        self._mark_seen(idx, pos)
+        if idx < 0:
+            self.outside[pos] = value
+        else:
+            self.flat[idx] = value
+
+    def _mark_seen(self, idx, pos):
+        if idx < 0:
+            if pos not in self.outside_seen:
+                self.outside_seen[pos] = self.seen_count
+                self.seen_count += 1
+        elif self.first_seen[idx] < 0:
+            self.first_seen[idx] = self.seen_count
+            self.seen_count += 1
+
+    def visit(self, pos, time=None):
+        """counter[pos] += 1 с учётом времени посещения в timeline."""
+        idx = self.index(pos)
+        if idx < 0:
+            self._mark_seen(idx, pos)
+            self.outside[pos] += 1
+            return
+        if self.first_seen[idx] < 0:
+            self.first_seen[idx] = self.seen_count
+            self.seen_count += 1
+        self.flat[idx] += 1
+        if self.timeline is not None and time is not None:
+            self.timeline.add(idx, time)
+
+    def get(self, pos, default=0):
+        idx = self.index(pos)
+        if idx < 0:
+            return self.outside.get(pos, default)
+        return int(self.flat[idx])
+
+    def total(self):
+        return int(self.flat.sum()) + sum(self.outside.values())
+
+    def items(self):
+        """Ненулевые клетки в порядке индекса."""
+        for idx in np.flatnonzero(self.flat):
+            yield (int(idx % self.grid_width), int(idx // self.grid_width)), int(self.flat[idx])
+        for pos, value in self.outside.items():
+            if value:
+                yield pos, value
+
+    def top(self, limit=None):
+        """
+        Клетки по убыванию счётчика, равные — в порядке первого посещения.
+        С limit берутся только limit лучших через argpartition, без полной
+        сортировки; равные на границе отбираются тоже по первому посещению.
+        """
+        if limit is not None and limit <= 0:
+            return []
+        idx = np.flatnonzero(self.flat)
+        values = self.flat[idx]
+        seen = self.first_seen[idx]
+        if limit is not None and limit < len(idx):
+            kth = values[np.argpartition(-values, limit - 1)[limit - 1]]
+            above = np.flatnonzero(values > kth)
+            tied = np.flatnonzero(values == kth)
+            tied = tied[np.argsort(seen[tied], kind="stable")[:limit - len(above)]]
+            best = np.concatenate([above, tied])
+            idx, values, seen = idx[best], values[best], seen[best]
+        order = np.lexsort((seen, -values))
+        top = [((int(i % self.grid_width), int(i // self.grid_width)), int(v)) for i, v in zip(idx[order], values[order])]
+        if self.outside:
+            ranks = {pos: int(rank) for (pos, _), rank in zip(top, seen[order])}
+            ranks.update(self.outside_seen)
+            top.extend((pos, value) for pos, value in self.outside.items() if value)
+            top.sort(key=lambda item: (-item[1], ranks[item[0]]))
+            if limit is not None:
+                top = top[:limit]
+        return top
+
+
+####################################
+#     Посещения по времени        #
+####################################
+class TimeBucketHeatmap:
+    """
+    Тензор посещений counts[интервал, z, x] с интервалами по bucket_seconds
+    от start_time. Посещения раньше start_time и позже end_time попадают
+    в крайние интервалы.
+    """
+
+    def __init__(self, grid_width, grid_height, bucket_seconds, start_time, end_time):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.bucket_seconds = bucket_seconds
+        self.start_time = start_time
+        self.buckets = max(1, math.ceil((end_time - start_time) / bucket_seconds))
+        self.counts = np.zeros((self.buckets, grid_height, grid_width), dtype=np.int32)
+        self.flat = self.counts.reshape(-1)
+        self.cells = grid_width * grid_height
+
+    def add(self, idx, time):
+        bucket = int((time - self.start_time) // self.bucket_seconds)
+        bucket = min(max(bucket, 0), self.buckets - 1)
+        self.flat[bucket * self.cells + idx] += 1
+
+    def to_compact(self):
+        return encode_heatmap(self.counts, self.bucket_seconds, self.start_time)
+
+
+def encode_heatmap(counts, bucket_seconds, start_time):
+    """Разреженный вид тензора для JSON: плоские индексы ненулевых клеток и значения, int32 в base64."""
+    flat = counts.reshape(-1)
+    indices = np.flatnonzero(flat).astype("<i4")
+    return {
+        "shape": list(counts.shape),
+        "bucket_seconds": bucket_seconds,
+        "start_time": start_time,
+        "indices": base64.b64encode(indices.tobytes()).decode("ascii"),
+        "values": base64.b64encode(flat[indices].astype("<i4").tobytes()).decode("ascii"),
+    }
+
+
+def decode_heatmap(compact):
+    """Плотный тензор (интервал, z, x) из TimeBucketHeatmap.to_compact."""
+    counts = np.zeros(int(np.prod(compact["shape"])), dtype=np.int32)
+    indices = np.frombuffer(base64.b64decode(compact["indices"]), dtype="<i4")
+    counts[indices] = np.frombuffer(base64.b64decode(compact["values"]), dtype="<i4")
+    return counts.reshape(compact["shape"])
+
+
+def rebucket_heatmap(counts, factor):
+    """Склеивает по factor соседних интервалов (последний может быть неполным)."""
+    buckets = math.ceil(counts.shape[0] / factor)
+    padded = np.zeros((buckets * factor,) + counts.shape[1:], dtype=counts.dtype)
+    padded[:counts.shape[0]] = counts
+    return padded.reshape((buckets, factor) + counts.shape[1:]).sum(axis=1)
+
+
+####################################
+#       Разметка стеллажей        #
+####################################
+class ShelfLayout:
+    """
+    Клетки стеллажей в виде массивов: плоский индекс клетки и номер стеллажа
+    (в порядке store_schema['shelves']). Сумма счётчика по каждому стеллажу
+    считается одним np.bincount; стеллажи могут пересекаться.
+    """
+
+    def __init__(self, grid_width, grid_height, shelves):
+        self.cells = []
+        shelf_ids = []
+        positions = []
+        for shelf_id, shelf in enumerate(shelves):
+            x = shelf["x"]
+            z = shelf["z"]
+            width = shelf.get("width", 3)
+            depth = shelf.get("depth", 1)
+            cells = [(x + i, z + j) for i in range(width) for j in range(depth)]
+            self.cells.append(cells)
+            shelf_ids.extend([shelf_id] * len(cells))
+            positions.extend(cells)
+        self.count = len(self.cells)
+        self.shelf_ids = np.array(shelf_ids, dtype=np.int64)
+        self.positions = positions
+        self.flat_index = np.array(
+            [int(z) * grid_width + int(x) if 0 <= int(x) < grid_width and 0 <= int(z) < grid_height else -1
+             for x, z in positions],
+            dtype=np.int64,
+        )
+        self.inside = self.flat_index >= 0
+
+    def totals(self, counter):
+        """Сумма CellCounter по клеткам каждого стеллажа."""
+        values = np.zeros(len(self.flat_index), dtype=np.int64)
+        values[self.inside] = counter.flat[self.flat_index[self.inside]]
+        if counter.outside:
+            for k in np.flatnonzero(~self.inside):
+                values[k] = counter.outside.get(self.positions[k], 0)
+        return np.bincount(self.shelf_ids, weights=values, minlength=self.count).astype(np.int64)
@@ -0,0 +1,390 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.managers import BaseManager
+
+from app.config import settings
+from app.utils.simulations import run_simulation, convert_np, generate_clients
+from app.utils.store_models import store_model_cache
+from app.utils.persistence import persist_simulation
+
+# Статусы задачи
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_FINISHED = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+# Как часто воркер сообщает прогресс (в завершённых клиентах)
+PROGRESS_EVERY = 50
+
+# Сколько завершённых задач хранить вместе с результатами
+JOB_HISTORY_SIZE = 100
+
+# Результаты лежат файлами, а не в памяти JobsManager: статус задачи не тянет их через прокси
+RESULTS_DIR = settings.SIMULATION_RESULTS_DIR or os.path.join(tempfile.gettempdir(), "simulation_results")
+
+# Переменная окружения с адресом JobsManager супервизора
+JOBS_MANAGER_ENV = "SIMULATION_JOBS_MANAGER"
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class QueueFull(Exception):
+    """В очереди уже SIMULATION_QUEUE_DEPTH незавершённых задач."""
+
+
+class SimulationCancelled(Exception):
+    """Задача отменена во время выполнения."""
+
+
+def _run_job(run_id, map_id, store_schema, num_persons, options, registry):
+    """Выполняется в процессе пула: прогон с прогрессом и проверкой отмены."""
+    if registry.is_cancelled(run_id):
+        raise SimulationCancelled(run_id)
+    registry.set_progress(run_id, 0.0)
+    # Кэш моделей у каждого процесса пула свой: повторные прогоны карты не компилируют её заново
+    model = store_model_cache.get(map_id, store_schema)
+
+    def progress(done, total):
+        if done % PROGRESS_EVERY and done != total:
+            return
+        if registry.is_cancelled(run_id):
+            raise SimulationCancelled(run_id)
+        registry.set_progress(run_id, done / total)
+
+    report = run_simulation(num_persons, store_schema, model=model, progress=progress, **options)
+    # Результат пишется в файл без numpy-типов, в родителя уходит только путь
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{run_id}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, default=convert_np)
+    return path
+
+
+def _load_result(path):
+    """Результат задачи из файла; None, если его уже удалили вместе с историей."""
+    if path is None:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _remove_result(path):
+    if path is None:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+####################################
+#      Общее состояние задач      #
+####################################
+class JobRegistry:
+    """
+    Статусы, прогресс, флаги отмены и пути к файлам результатов задач
+    всех воркеров uvicorn. Живёт в процессе JobsManager, воркеры и процессы пула зовут
+    методы через прокси; менеджер обслуживает каждое соединение в своём
+    потоке, поэтому все методы под блокировкой.
+    """
+
+    def __init__(self):
+        self.jobs = OrderedDict()
+        # run_id -> путь к файлу результата в RESULTS_DIR
+        self.results = {}
+        self.progress = {}
+        self.cancelled = set()
+        self.lock = threading.Lock()
+
+    def add(self, job, queue_depth):
+        """Регистрирует задачу; False — уже queue_depth незавершённых задач."""
+        with self.lock:
+            active = sum(1 for item in self.jobs.values() if item["status"] not in JOB_FINISHED)
+            if active >= queue_depth:
+                return False
+            self.jobs[job["run_id"]] = job
+            return True
+
+    def get(self, run_id):
+        with self.lock:
+            job = self.jobs.get(run_id)
+            if job is None:
+                return None
+            job = dict(job)
+            progress = self.progress.get(run_id)
+            if job["status"] not in JOB_FINISHED and progress is not None:
+                job["status"] = JOB_RUNNING
+                job["progress"] = progress
+            return job
+
+    def result_path(self, run_id):
+        with self.lock:
+            return self.results.get(run_id)
+
+    def update(self, run_id, **fields):
+        with self.lock:
+            job = self.jobs.get(run_id)
+            if job is not None:
+                job.update(fields)
+
+    def set_progress(self, run_id, value):
+        with self.lock:
+            job = self.jobs.get(run_id)
+            if job is None or job["status"] in JOB_FINISHED:
+                return
+            job["started_at"] = job["started_at"] or time.time()
+            self.progress[run_id] = value
+
+    def cancel(self, run_id):
+        """Ставит флаг отмены; False, если задачи нет или она уже завершилась."""
+        with self.lock:
+            job = self.jobs.get(run_id)
+            if job is None or job["status"] in JOB_FINISHED:
+                return False
+            self.cancelled.add(run_id)
+            return True
+
+    def is_cancelled(self, run_id):
+        return run_id in self.cancelled
+
+    def finish(self, run_id, status, result_path=None, error=None):
+        with self.lock:
+            job = self.jobs.get(run_id)
+            if job is None or job["status"] in JOB_FINISHED:
+                # Задачу уже отменили или вычистили из истории — её файл никто не прочитает
+                _remove_result(result_path)
+                return
+            job["status"] = status
+            job["finished_at"] = time.time()
+            if error is not None:
+                job["error"] = error
+            if status == JOB_COMPLETED:
+                job["progress"] = 1.0
+                self.results[run_id] = result_path
+            elif job["persisted"] == "pending":
+                job["persisted"] = None
+            self.progress.pop(run_id, None)
+            self.cancelled.discard(run_id)
+            self._trim_history()
+
+    def _trim_history(self):
+        finished = [run_id for run_id, job in self.jobs.items() if job["status"] in JOB_FINISHED]
+        for run_id in finished[:max(0, len(finished) - JOB_HISTORY_SIZE)]:
+            del self.jobs[run_id]
+            _remove_result(self.results.pop(run_id, None))
+
+
+_job_registry = None
+
+
+def _get_job_registry():
+    # Вызывается в процессе менеджера: один реестр на все подключения
+    global _job_registry
+    if _job_registry is None:
+        _job_registry = JobRegistry()
+    return _job_registry
+
+
+class JobsManager(BaseManager):
+    """Сервер JobRegistry; воркеры подключаются к нему по адресу из JOBS_MANAGER_ENV."""
+
+
+JobsManager.register("registry", callable=_get_job_registry)
+
+
+def start_jobs_manager():
+    """
+    Запускает общий реестр задач в процессе-супервизоре до старта
+    воркеров uvicorn: адрес передаётся им через переменную окружения,
+    ключ доступа воркеры наследуют от родителя.
+    """
+    # Файлы результатов прошлого запуска реестр уже не знает
+    shutil.rmtree(RESULTS_DIR, ignore_errors=True)
+    manager = JobsManager()
+    manager.start()
+    os.environ[JOBS_MANAGER_ENV] = manager.address
+    return manager
+
+
+class SimulationJobs:
+    """
+    Фоновые симуляции в пуле процессов.
+
+    submit сразу возвращает run_id, прогон идёт в процессе пула, а
+    статус, прогресс и результат читаются через get. Процессов не больше
+    SIMULATION_WORKERS на воркер uvicorn, незавершённых задач не больше
+    queue_depth на всё приложение: сверх этого submit бросает QueueFull.
+    Состояние задач лежит в JobRegistry супервизора (start_jobs_manager),
+    поэтому get и cancel работают в любом воркере uvicorn, а не только в
+    принявшем submit. Без run_uvicorn (uvicorn app.fastapi_server:app)
+    реестр поднимается в самом процессе, а воркер супервизора без общего
+    реестра предупреждает об этом в лог.
+    """
+
+    def __init__(self, workers, queue_depth):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.futures = {}
+        # Схема магазина, число клиентов и seed задач, результаты которых нужно сохранить в БД
+        self.persist_runs = {}
+        self.pool = None
+        self.manager = None
+        self.registry = None
+        self.lock = threading.Lock()
+        # Сильные ссылки на задачи event loop: сам он держит их слабо
+        self.watchers = set()
+        self.persists = set()
+
+    def _ensure_registry(self):
+        if self.registry is None:
+            address = os.environ.get(JOBS_MANAGER_ENV)
+            if address:
+                self.manager = JobsManager(address=address)
+                self.manager.connect()
+            else:
+                if multiprocessing.parent_process() is not None:
+                    # Воркер супервизора без общего реестра (uvicorn --workers N в обход run_uvicorn)
+                    logger.warning("%s не задан: задачи симуляций видны только воркеру %d, "
+                                   "запускайте сервер через run_uvicorn", JOBS_MANAGER_ENV, os.getpid())
+                self.manager = JobsManager()
+                self.manager.start()
+            self.registry = self.manager.registry()
+        return self.registry
+
+    def _ensure_pool(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def submit(self, map_id, store_schema, num_persons, persist=False, seed=42, **options):
+        """
+        seed и options передаются в run_simulation (trajectory_format, heatmap_bucket_seconds,
+        route_order, popular_zones_limit). С persist результат после завершения
+        пишется в БД с run_id задачи вместе с профилями клиентов того же seed.
+        """
+        with self.lock:
+            registry = self._ensure_registry()
+            run_id = uuid.uuid4().hex
+            job = {
+                "run_id": run_id,
+                "map_id": map_id,
+                "num_persons": num_persons,
+                "status": JOB_QUEUED,
+                "progress": 0.0,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "error": None,
+                "persisted": "pending" if persist else None,
+            }
+            if not registry.add(job, self.queue_depth):
+                raise QueueFull()
+            self._ensure_pool()
+            if persist:
+                self.persist_runs[run_id] = (store_schema, num_persons, seed)
+            future = self.pool.submit(_run_job, run_id, map_id, store_schema, num_persons,
+                                      dict(options, seed=seed), registry)
+        self.futures[run_id] = future
+        self._spawn(self.watchers, self._watch(run_id, map_id, asyncio.wrap_future(future)))
+        return run_id
+
+    @staticmethod
+    def _spawn(tasks, coro):
+        task = asyncio.ensure_future(coro)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        return task
+
+    async def _watch(self, run_id, map_id, future):
+        registry = self.registry
+        try:
+            result_path = await future
+            registry.finish(run_id, JOB_COMPLETED, result_path=result_path)
+            persist_run = self.persist_runs.pop(run_id, None)
+            if persist_run is not None:
+                self._spawn(self.persists, self._persist(run_id, map_id, *persist_run, result_path))
+        except (SimulationCancelled, asyncio.CancelledError):
+            registry.finish(run_id, JOB_CANCELLED)
+        except Exception as exc:
+            registry.finish(run_id, JOB_FAILED, error=repr(exc))
+        finally:
+            self.persist_runs.pop(run_id, None)
+            self.futures.pop(run_id, None)
+
+    async def _persist(self, run_id, map_id, store_schema, num_persons, seed, result_path):
+        try:
+            result = await asyncio.to_thread(_load_result, result_path)
+            # Профили клиентов зависят только от числа и seed — строим те же, что в прогоне
+            clients = generate_clients(num_persons, seed)
+            await persist_simulation(map_id, run_id, store_schema, result["results"], clients)
+            self.registry.update(run_id, persisted="done")
+        except asyncio.CancelledError:
+            self.registry.update(run_id, persisted="failed", error="запись прервана остановкой воркера")
+            raise
+        except Exception as exc:
+            self.registry.update(run_id, persisted="failed", error=repr(exc))
+
+    def get(self, run_id, with_result=False):
+        """
+        Статус задачи. Результат читается из файла только с with_result —
+        он бывает большим, а статус опрашивают часто.
+        """
+        registry = self._ensure_registry()
+        job = registry.get(run_id)
+        if job is not None and with_result:
+            job["result"] = _load_result(registry.result_path(run_id))
+        return job
+
+    def cancel(self, run_id):
+        """Отменяет задачу; возвращает False, если она уже завершилась."""
+        if not self._ensure_registry().cancel(run_id):
+            return False
+        # Ещё не отданную в процесс задачу своего пула снимаем сразу; запущенная
+        # или стоящая в пуле другого воркера увидит флаг на ближайшей проверке
+        future = self.futures.get(run_id)
+        if future is not None:
+            future.cancel()
+        return True
+
+    async def shutdown(self, timeout=None):
+        """
+        Останавливает пул: незавершённые задачи воркера отменяются, а уже
+        начатую запись результатов в БД ждём до timeout секунд.
+        """
+        if self.registry is None:
+            return
+        # Незавершённые задачи этого воркера уже не доработают: отдаём их как отменённые
+        for run_id in list(self.futures):
+            self.registry.finish(run_id, JOB_CANCELLED)
+        for task in list(self.watchers):
+            task.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        if self.watchers:
+            await asyncio.gather(*self.watchers, return_exceptions=True)
+        if self.persists:
+            persists = list(self.persists)
+            _, pending = await asyncio.wait(persists, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*persists, return_exceptions=True)
+        # Реестр не останавливаем: статусы нужны до последнего ответа воркера,
+        # а свой JobsManager финализатор multiprocessing закроет при выходе процесса
+
+
+simulation_jobs = SimulationJobs(settings.SIMULATION_WORKERS, settings.SIMULATION_QUEUE_DEPTH)
@@ -0,0 +1,100 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from app import database
+from app.utils.trajectories import decode_trajectory, is_compact
+
+# Базовая цена товара: продажа со скидкой d% стоит BASE_PRICE * (1 - d / 100)
+BASE_PRICE = 100.0
+
+PERSON_COLUMNS = ["id", "map_id", "target_product", "preferences", "run_id", "created_at"]
+MOVEMENT_COLUMNS = ["person_id", "map_id", "x", "y", "z", "run_id", "created_at"]
+SALE_COLUMNS = ["person_id", "map_id", "product_id", "price", "run_id", "created_at"]
+
+
+def product_lookup(store_schema):
+    """Имя товара в нижнем регистре -> (id товара, цена продажи)."""
+    lookup = {}
+    for shelf in store_schema.get("shelves", []):
+        for product in shelf.get("products", []):
+            discount = product.get("percent_discount") or 0
+            lookup[product["name"].lower()] = (product.get("id"), BASE_PRICE * (1 - discount / 100))
+    return lookup
+
+
+def _start_time(result):
+    path = result["path"]
+    if is_compact(path):
+        return path["start_time"] if path["steps"] else result["end_time"]
+    return path[0]["time"] if path else result["end_time"]
+
+
+def _movement_records(results, person_ids, map_id, run_id, day_start):
+    for person_id, result in zip(person_ids, results):
+        path = result["path"]
+        if is_compact(path):
+            path = decode_trajectory(path)
+        for step in path:
+            yield (person_id, map_id, int(step["x"]), 0, int(step["z"]), run_id,
+                   day_start + timedelta(seconds=step["time"]))
+
+
+def _sale_records(results, person_ids, map_id, run_id, day_start, products):
+    for person_id, result in zip(person_ids, results):
+        for purchase in result["purchases"]:
+            if not purchase["purchased"]:
+                continue
+            product = products.get(purchase["item"].lower())
+            if product is None or product[0] is None:
+                continue
+            product_id, price = product
+            yield (person_id, map_id, product_id, price, run_id,
+                   day_start + timedelta(seconds=purchase["time"]))
+
+
+async def persist_simulation(map_id, run_id, store_schema, results, clients, day_start=None):
+    """
+    Записывает прогон в persons, person_movements и sales через COPY asyncpg
+    одной транзакцией. id людей выделяются заранее из последовательности,
+    чтобы движения и продажи ссылались на них без RETURNING по строке.
+    clients — профили клиентов прогона (generate_clients): из них берутся
+    предпочтения и целевой товар — первый в списке покупок.
+    Время модели (секунды от полуночи) переводится в created_at от day_start.
+    """
+    if not results:
+        return
+    if day_start is None:
+        day_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    profiles = {client["name"]: client for client in clients}
+    products = product_lookup(store_schema)
+
+    async with database.engine.begin() as conn:
+        person_ids = (await conn.execute(
+            text("SELECT nextval(pg_get_serial_sequence('persons', 'id')) FROM generate_series(1, :n)"),
+            {"n": len(results)},
+        )).scalars().all()
+        raw = await conn.get_raw_connection()
+        copy = raw.driver_connection.copy_records_to_table
+
+        person_records = []
+        for person_id, result in zip(person_ids, results):
+            client = profiles[result["client"]]
+            shopping_list = client["shopping_list"]
+            person_records.append((
+                person_id, map_id, shopping_list[0] if shopping_list else None,
+                json.dumps(list(client["preferences"]), ensure_ascii=False),
+                run_id, day_start + timedelta(seconds=_start_time(result)),
+            ))
+        await copy("persons", records=person_records, columns=PERSON_COLUMNS)
+        await copy("person_movements", columns=MOVEMENT_COLUMNS,
+                   records=_movement_records(results, person_ids, map_id, run_id, day_start))
+        await copy("sales", columns=SALE_COLUMNS,
+                   records=_sale_records(results, person_ids, map_id, run_id, day_start, products))
+
+
+async def persist_simulation_json(map_id, run_id, store_schema, report_json, clients):
+    """persist_simulation для готового JSON-отчёта (ответ /simulations/start)."""
+    report = json.loads(report_json)
+    await persist_simulation(map_id, run_id, store_schema, report["results"], clients)
@@ -0,0 +1,93 @@
+from collections import deque
+
+import numpy as np
+
+# Перцентили времени ожидания в отчёте по кассам
+WAIT_PERCENTILES = (50, 90, 99)
+
+# Числовые показатели кассы, которые сводятся по прогонам (см. app.utils.batch)
+KASSA_METRICS = (
+    "served", "balked", "breakdowns", "down_time", "busy_time", "utilization", "max_queue_length",
+    "wait_mean",
+) + tuple(f"wait_p{q}" for q in WAIT_PERCENTILES)
+
+
+####################################
+#         Очереди к кассам        #
+####################################
+class KassaQueue:
+    """
+    Касса с одним кассиром и очередью FIFO; вместе кассы дают M/G/c, где
+    клиент сам выбирает очередь (StoreSimulation.choose_kassa).
+
+    Время обслуживания клиента известно при постановке в очередь, поэтому
+    начало обслуживания — max(время прихода, busy_until) и постановка
+    и уход — O(1): append и popleft в deque, уходят строго по порядку.
+    В waiting стоят все, кто ещё не ушёл от кассы, включая обслуживаемого.
+    """
+
+    def __init__(self, index, position):
+        self.index = index
+        self.position = position
+        self.waiting = deque()
+        self.busy_until = 0.0
+        self.busy_time = 0.0
+        self.down_time = 0.0
+        self.served = 0
+        self.balked = 0
+        self.breakdowns = 0
+        self.max_length = 0
+        self.waits = []
+
+    def __len__(self):
+        return len(self.waiting)
+
+    def join(self, client_name, time, service_time, repair_time=0.0):
+        """
+        Ставит клиента в конец очереди. repair_time > 0 — касса ломается
+        перед его обслуживанием, и всё, что за ним, сдвигается на ремонт.
+        Возвращает (начало обслуживания, окончание, время поломки или None).
+        """
+        start = max(time, self.busy_until)
+        broken_at = None
+        if repair_time:
+            broken_at = start
+            start += repair_time
+            self.breakdowns += 1
+            self.down_time += repair_time
+        finish = start + service_time
+        self.busy_until = finish
+        self.busy_time += service_time
+        self.waits.append(start - time)
+        self.waiting.append(client_name)
+        self.max_length = max(self.max_length, len(self.waiting))
+        return start, finish, broken_at
+
+    def leave(self):
+        """Уход обслуженного клиента — всегда первого в очереди."""
+        self.served += 1
+        return self.waiting.popleft()
+
+    def balk(self):
+        """Клиент увидел длинную очередь и ушёл, не вставая в неё."""
+        self.balked += 1
+
+    def statistics(self, open_time, close_time):
+        waits = np.asarray(self.waits, dtype=float)
+        stats = {
+            "kassa": self.index + 1,
+            "x": self.position[0],
+            "z": self.position[1],
+            "served": self.served,
+            "balked": self.balked,
+            "breakdowns": self.breakdowns,
+            "down_time": self.down_time,
+            "busy_time": self.busy_time,
+            "utilization": round(self.busy_time / (close_time - open_time), 4),
+            "max_queue_length": self.max_length,
+            "wait_mean": float(waits.mean()) if waits.size else 0.0,
+        }
+        percentiles = np.percentile(waits, WAIT_PERCENTILES) if waits.size else [0.0] * len(WAIT_PERCENTILES)
+        for q, value in zip(WAIT_PERCENTILES, percentiles):
+            stats[f"wait_p{q}"] = float(value)
+        return stats
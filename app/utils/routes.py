@@ -0,0 +1,115 @@
+import math
+
+import numpy as np
+
+# Предел проходов 2-opt на один маршрут; обычно улучшения кончаются за 2-3 прохода
+TWO_OPT_MAX_PASSES = 10
+
+
+####################################
+#       Матрица расстояний        #
+####################################
+class RouteMatrix:
+    """
+    Расстояния в шагах по статической карте между стеллажами с товарами
+    и от каждого из них до ближайшей кассы. Строится один раз на
+    планировку из полей расстояний (DistanceField) до стеллажей и касс;
+    недостижимые пары — math.inf.
+    """
+
+    def __init__(self, shelves, kasses, field_for):
+        self.shelves = list(shelves)
+        self.index = {shelf: i for i, shelf in enumerate(self.shelves)}
+        self.fields = [field_for(shelf) for shelf in self.shelves]
+        n = len(self.shelves)
+        dist = np.full((n, n), math.inf)
+        for j, field in enumerate(self.fields):
+            for i, shelf in enumerate(self.shelves):
+                d = field.distance(shelf)
+                if d is not None:
+                    dist[i, j] = d
+        exit_dist = np.full((n, max(len(kasses), 1)), math.inf)
+        for k, kassa in enumerate(kasses):
+            field = field_for(kassa)
+            for i, shelf in enumerate(self.shelves):
+                d = field.distance(shelf)
+                if d is not None:
+                    exit_dist[i, k] = d
+        self.dist = dist
+        self.kassa_dist = exit_dist[:, :len(kasses)]
+        # Списки быстрее numpy при поштучном доступе в переборе 2-opt
+        self.shelf_dist = dist.tolist()
+        self.exit_dist = exit_dist.min(axis=1).tolist()
+
+    def from_position(self, position, shelves):
+        """Расстояния от произвольной клетки до стеллажей (по индексам)."""
+        distances = []
+        for i in shelves:
+            d = self.fields[i].distance(position)
+            distances.append(math.inf if d is None else d)
+        return distances
+
+
+def route_cost(order, start_dist, shelf_dist, exit_dist):
+    """Длина маршрута: вход -> стеллажи в порядке order -> ближайшая касса."""
+    if not order:
+        return 0
+    cost = start_dist[order[0]] + exit_dist[order[-1]]
+    for a, b in zip(order, order[1:]):
+        cost += shelf_dist[a][b]
+    return cost
+
+
+def order_shelves(start_dist, shelf_dist, exit_dist, shelves):
+    """
+    Порядок обхода стеллажей: ближайший сосед от входа, затем 2-opt по
+    открытому маршруту с фиксированным началом и выходом к любой кассе.
+    start_dist — расстояния от клиента до стеллажей по их индексам.
+    """
+    remaining = set(shelves)
+    order = []
+    current = None
+    while remaining:
+        if current is None:
+            nearest = min(remaining, key=lambda s: (start_dist[s], s))
+        else:
+            row = shelf_dist[current]
+            nearest = min(remaining, key=lambda s: (row[s], s))
+        order.append(nearest)
+        remaining.discard(nearest)
+        current = nearest
+    best = route_cost(order, start_dist, shelf_dist, exit_dist)
+    for _ in range(TWO_OPT_MAX_PASSES):
+        improved = False
+        for i in range(len(order) - 1):
+            for j in range(i + 1, len(order)):
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                cost = route_cost(candidate, start_dist, shelf_dist, exit_dist)
+                if cost < best:
+                    order, best = candidate, cost
+                    improved = True
+        if not improved:
+            break
+    return order
+
+
+def order_stops(routes, position, stops):
+    """
+    Переставляет остановки (товар, клетка стеллажа) в порядок обхода.
+    Товары одного стеллажа идут подряд в исходном порядке; остановки у
+    стеллажей вне матрицы остаются в конце.
+    """
+    by_shelf = {}
+    unknown = []
+    for item, shelf in stops:
+        i = routes.index.get(shelf)
+        if i is None:
+            unknown.append(item)
+        else:
+            by_shelf.setdefault(i, []).append(item)
+    if len(by_shelf) < 2:
+        return [item for items in by_shelf.values() for item in items] + unknown
+    shelves = list(by_shelf)
+    start_dist = dict(zip(shelves, routes.from_position(position, shelves)))
+    order = order_shelves(start_dist, routes.shelf_dist, routes.exit_dist, shelves)
+    return [item for i in order for item in by_shelf[i]] + unknown
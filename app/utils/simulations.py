@@ -1,13 +1,19 @@
 import asyncio
+import heapq
 import numpy as np
 import random
 import json
 from collections import deque, defaultdict
 from typing import List, Dict
 from pydantic import BaseModel
+from app.utils.grid import OccupancyGrid, DistanceField, DistanceFields, grid_bounds, obstacle_mask
+from app.utils.heatmaps import CellCounter, ShelfLayout, TimeBucketHeatmap
+from app.utils.corridors import CorridorGraph
+from app.utils.routes import RouteMatrix, order_stops
 
 # Настройка seed для воспроизводимости
 SPONTANEOUS_BASE_CHANCE = 0.25  # вероятность спонтанной покупки
+SPONTANEOUS_MIN_ATTRACTION = 0.7  # минимальная привлекательность полки для спонтанной покупки
 
 # Вероятности и бонусы для покупки
 BASE_PURCHASE_CHANCE = 0.15      # немного повышена базовая вероятность покупки
@@ -29,6 +35,8 @@ QUEUE_SERVICE_TIME = 8
 # Настройки очереди и касс
 MAX_QUEUE_LENGTH_DEFAULT = 5
 KASSA_BREAK_PROB = 0.0002  # вероятность поломки касс
+KASSA_REPAIR_TIME = 600  # ремонт сломанной кассы, секунд
+SERVICE_TIME_PER_ITEM = 2  # к QUEUE_SERVICE_TIME за каждую купленную позицию
 
 # Масштаб времени симуляции
 SIMULATION_SCALE = 0.000002
@@ -37,6 +45,25 @@ SIMULATION_SCALE = 0.000002
 GROUP_SIZE_NON_PEAK = 5
 GROUP_SIZE_PEAK = 15
 
+# Движки сетки занятости: "set" — множество кортежей, "array" — массив uint8
+GRID_ENGINES = ("set", "array")
+
+# Планировщики поиска пути: "bfs" и "astar" ведут статический путь по полям
+# расстояний, "corridors" — по сжатому графу проходов (app.utils.corridors)
+PLANNERS = ("bfs", "astar", "corridors")
+
+# Форматы траекторий клиентов: "json" — список шагов-словарей,
+# "compact" — дельты int16 в base64 (см. app.utils.trajectories)
+TRAJECTORY_FORMATS = ("json", "compact")
+
+# Порядок обхода списка покупок: "list" — как в списке, "tsp" — ближайший
+# сосед + 2-opt по матрице расстояний между стеллажами (app.utils.routes)
+ROUTE_ORDERS = ("list", "tsp")
+
+# Локальный ремонт пути: обход ищется к одной из следующих клеток маршрута
+REPAIR_WINDOW = 8
+REPAIR_MAX_EXPANSIONS = 64
+
 ####################################
 #         Классы и генерация      #
 ####################################
@@ -273,10 +300,219 @@ class CustomerGenerator:
         customers = await asyncio.gather(*tasks)
         return customers
 
+    def build_vocabulary(self):
+        """Плоский словарь товаров и категорий для пакетной генерации."""
+        categories = list(self.product_categories)
+        product_names = []
+        product_category = []
+        for c, category in enumerate(categories):
+            for product in self.product_categories[category]["products"]:
+                product_names.append(product)
+                product_category.append(c)
+        return categories, product_names, np.array(product_category, dtype=np.int16)
+
+    def generate_batch(self, count: int, rng: np.random.Generator = None) -> "CustomerBatch":
+        """
+        Генерирует сразу count клиентов векторно через numpy Generator.
+        Возвращает колоночную структуру; dict/pydantic-формы строятся по запросу.
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        categories, product_names, product_category = self.build_vocabulary()
+        n_segments = len(self.segments)
+        n_categories = len(categories)
+        n_products = len(product_names)
+
+        segment = rng.choice(n_segments, size=count, p=self.segment_weights)
+
+        # Возраст: нормальное распределение вокруг центра диапазона сегмента
+        age_min = np.array([s["age_range"][0] for s in self.segments])
+        age_max = np.array([s["age_range"][1] for s in self.segments])
+        center = (age_min + age_max) / 2
+        std = (age_max - age_min) / 6
+        age = rng.normal(center[segment], std[segment]).astype(np.int64)
+        age = np.clip(age, age_min[segment], age_max[segment]).astype(np.int16)
+
+        motive_mask = self._sample_subsets(rng, segment, [s["motives"] for s in self.segments])
+        fear_mask = self._sample_subsets(rng, segment, [s["fears"] for s in self.segments])
+
+        allocation = np.zeros((n_segments, n_categories))
+        preferred = np.zeros((n_segments, n_categories), dtype=bool)
+        for s, seg in enumerate(self.segments):
+            for c, category in enumerate(categories):
+                allocation[s, c] = seg["budget_allocation"].get(category, 0)
+                preferred[s, c] = category in seg["preferences"]
+
+        # Предпочтения: по каждой категории выборка товаров без повторов
+        preference_mask = np.zeros((count, n_products), dtype=bool)
+        for c in range(n_categories):
+            columns = np.flatnonzero(product_category == c)
+            size = len(columns)
+            if size == 0:
+                continue
+            alloc = allocation[segment, c]
+            adjusted = alloc * rng.uniform(0.8, 1.3, size=count)
+            factor = np.where(preferred[segment, c], 1.0, 0.5)
+            k = np.clip(np.maximum(1, (adjusted * size * factor).astype(np.int64)), 0, size)
+            k[alloc < 0.05] = 0
+            ranks = rng.random((count, size)).argsort(axis=1).argsort(axis=1)
+            preference_mask[:, columns] = ranks < k[:, None]
+
+        # Размер списка покупок зависит от сегмента
+        size_low = np.array([self._shopping_list_range(s)[0] for s in self.segments])
+        size_high = np.array([self._shopping_list_range(s)[1] for s in self.segments])
+        list_size = rng.integers(size_low[segment], size_high[segment] + 1)
+        list_size = np.minimum(list_size, preference_mask.sum(axis=1))
+        keys = rng.random((count, n_products))
+        keys[~preference_mask] = np.inf
+        order = keys.argsort(axis=1)
+        take = np.arange(n_products)[None, :] < list_size[:, None]
+        shopping_ids = order[take].astype(np.int32)
+        shopping_offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(list_size, out=shopping_offsets[1:])
+
+        return CustomerBatch(
+            generator=self,
+            product_names=product_names,
+            segment=segment.astype(np.int8),
+            age=age,
+            motive_mask=motive_mask,
+            fear_mask=fear_mask,
+            preference_mask=preference_mask,
+            shopping_offsets=shopping_offsets,
+            shopping_ids=shopping_ids,
+        )
+
+    @staticmethod
+    def _shopping_list_range(segment):
+        if segment["name"] == "Работающие люди":
+            return 4, 8
+        if segment["name"] == "Молодые семьи с детьми":
+            return 7, 14
+        return 5, 12
+
+    @staticmethod
+    def _sample_subsets(rng, segment, options):
+        """Случайное непустое подмножество (до 3 элементов) вариантов сегмента для каждого клиента."""
+        width = max(len(o) for o in options)
+        sizes = np.array([len(o) for o in options])
+        count = len(segment)
+        available = np.arange(width)[None, :] < sizes[segment][:, None]
+        k = rng.integers(1, np.minimum(3, sizes[segment]) + 1)
+        keys = rng.random((count, width))
+        keys[~available] = np.inf
+        ranks = keys.argsort(axis=1).argsort(axis=1)
+        return ranks < k[:, None]
+
+
+class CustomerBatch:
+    """
+    Колоночное представление клиентов: массивы по сегментам, возрасту,
+    маскам мотивов/страхов/предпочтений и CSR-список покупок из
+    целочисленных id товаров. Симуляция работает с ним напрямую через
+    лёгкие CustomerView; словари и CustomerProfile строятся только по запросу.
+    """
+
+    def __init__(self, generator, product_names, segment, age, motive_mask, fear_mask,
+                 preference_mask, shopping_offsets, shopping_ids):
+        self.generator = generator
+        self.product_names = product_names
+        self.segment = segment
+        self.age = age
+        self.motive_mask = motive_mask
+        self.fear_mask = fear_mask
+        self.preference_mask = preference_mask
+        self.shopping_offsets = shopping_offsets
+        self.shopping_ids = shopping_ids
+        self.arrival_time = np.full(len(segment), np.nan)
+        self._views = [CustomerView(self, i) for i in range(len(segment))]
+
+    def __len__(self):
+        return len(self.segment)
+
+    def __iter__(self):
+        return iter(self._views)
+
+    def __getitem__(self, i):
+        return self._views[i]
+
+    def shopping_list_ids(self, i):
+        return self.shopping_ids[self.shopping_offsets[i]:self.shopping_offsets[i + 1]]
+
+    def field(self, i, key):
+        segment = self.generator.segments[self.segment[i]]
+        if key == "name":
+            return f"Клиент_{i + 1}"
+        if key == "age":
+            return int(self.age[i])
+        if key == "segment":
+            return segment["name"]
+        if key == "motives":
+            return [m for m, on in zip(segment["motives"], self.motive_mask[i]) if on]
+        if key == "fears":
+            return [f for f, on in zip(segment["fears"], self.fear_mask[i]) if on]
+        if key == "preferences":
+            return [self.product_names[p] for p in np.flatnonzero(self.preference_mask[i])]
+        if key == "shopping_list":
+            return [self.product_names[p] for p in self.shopping_list_ids(i)]
+        if key == "budget_allocation":
+            return segment["budget_allocation"]
+        if key == "arrival_time" and not np.isnan(self.arrival_time[i]):
+            return float(self.arrival_time[i])
+        raise KeyError(key)
+
+    def to_dicts(self) -> List[Dict]:
+        return [view.to_dict() for view in self._views]
+
+    def to_profiles(self) -> List[CustomerProfile]:
+        return [CustomerProfile(**{k: view[k] for k in CustomerProfile.model_fields}) for view in self._views]
+
+
+class CustomerView:
+    """Клиент из CustomerBatch с интерфейсом словаря, который нужен симуляции."""
+
+    __slots__ = ("batch", "index", "_cache")
+
+    FIELDS = ("name", "age", "segment", "motives", "preferences", "fears",
+              "shopping_list", "budget_allocation")
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+        self._cache = {}
+
+    def __getitem__(self, key):
+        if key == "arrival_time":
+            return self.batch.field(self.index, key)
+        if key not in self._cache:
+            self._cache[key] = self.batch.field(self.index, key)
+        return self._cache[key]
+
+    def __setitem__(self, key, value):
+        if key != "arrival_time":
+            raise KeyError(key)
+        self.batch.arrival_time[self.index] = value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def update(self, values):
+        for key, value in values.items():
+            self[key] = value
+
+    def to_dict(self):
+        data = {key: self[key] for key in self.FIELDS}
+        if not np.isnan(self.batch.arrival_time[self.index]):
+            data["arrival_time"] = float(self.batch.arrival_time[self.index])
+        return data
+
 ####################################
 #         Вспомогательные функции #
 ####################################
-def bfs_path(grid_width, grid_height, start, end, occupied_positions):
+def bfs_path(grid_width, grid_height, start, end, occupied_positions, stats=None):
     if start == end:
         return [start]
     visited = set()
@@ -286,6 +522,8 @@ def bfs_path(grid_width, grid_height, start, end, occupied_positions):
     queue.append(start)
     while queue:
         x, z = queue.popleft()
+        if stats is not None:
+            stats["path_expansions"] += 1
         for dx, dz in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
             nx, nz = x + dx, z + dz
             if 0 <= nx < grid_width and 0 <= nz < grid_height:
@@ -308,20 +546,101 @@ def bfs_path(grid_width, grid_height, start, end, occupied_positions):
 def manhattan_distance(p1, p2):
     return abs(p1[0] - p2[0]) + abs(p1[1] - p2[1])
 
+def astar_path(grid_width, grid_height, start, goals, occupied_positions,
+               max_expansions=None, stats=None):
+    """
+    A* с манхэттенской эвристикой. goals — одна клетка или набор клеток,
+    путь строится до ближайшей из них. Как и в bfs_path, цель достижима,
+    даже если она занята. При превышении max_expansions возвращает None.
+    """
+    if isinstance(goals, tuple):
+        goals = (goals,)
+    goals = set(goals)
+    if start in goals:
+        return [start]
+
+    def heuristic(cell):
+        return min(manhattan_distance(cell, goal) for goal in goals)
+
+    g_score = {start: 0}
+    parents = {}
+    counter = 0
+    # При равных f раскрываем более глубокие узлы — меньше раскрытий на открытых участках
+    heap = [(heuristic(start), 0, counter, start)]
+    closed = set()
+    expansions = 0
+    while heap:
+        _, neg_g, _, cell = heapq.heappop(heap)
+        if cell in closed:
+            continue
+        closed.add(cell)
+        expansions += 1
+        if max_expansions is not None and expansions > max_expansions:
+            break
+        g = -neg_g
+        x, z = cell
+        for dx, dz in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+            nxt = (x + dx, z + dz)
+            if not (0 <= nxt[0] < grid_width and 0 <= nxt[1] < grid_height):
+                continue
+            if nxt in goals:
+                parents[nxt] = cell
+                path = [nxt]
+                while path[-1] != start:
+                    path.append(parents[path[-1]])
+                path.reverse()
+                if stats is not None:
+                    stats["path_expansions"] += expansions
+                return path
+            if nxt in closed or nxt in occupied_positions:
+                continue
+            if g + 1 < g_score.get(nxt, g + 2):
+                g_score[nxt] = g + 1
+                parents[nxt] = cell
+                counter += 1
+                heapq.heappush(heap, (g + 1 + heuristic(nxt), -(g + 1), counter, nxt))
+    if stats is not None:
+        stats["path_expansions"] += expansions
+    return None
+
+def repair_path(path_cells, i, position, occupied_positions, grid_width, grid_height,
+                window=REPAIR_WINDOW, max_expansions=REPAIR_MAX_EXPANSIONS, stats=None):
+    """
+    Локальный обход занятой клетки path_cells[i]: короткий A* до одной из
+    следующих свободных клеток маршрута, дальше — остаток исходного пути.
+    """
+    destination = path_cells[-1]
+    goals = {}
+    for k in range(i + 1, min(len(path_cells), i + 1 + window)):
+        cell = path_cells[k]
+        if cell == destination or cell not in occupied_positions:
+            goals.setdefault(cell, k)
+    if not goals:
+        return None
+    detour = astar_path(grid_width, grid_height, position, goals, occupied_positions,
+                        max_expansions=max_expansions, stats=stats)
+    if detour is None:
+        return None
+    return detour + path_cells[goals[detour[-1]] + 1:]
+
 def move_along_path(path_cells, current_time, current_occupied, cell_visits,
                     grid_width, grid_height,
-                    block_time=BLOCK_TIME_SECONDS, close_time=CLOSE_TIME_SECONDS):
+                    block_time=BLOCK_TIME_SECONDS, close_time=CLOSE_TIME_SECONDS,
+                    replan=None):
     destination = path_cells[-1]
     path_log = []
     position = path_cells[0]
     current_occupied.add(position)
     path_log.append({"x": position[0], "z": position[1], "time": current_time})
-    cell_visits[position] += 1
+    cell_visits.visit(position, current_time)
     i = 1
     while i < len(path_cells):
         next_cell = path_cells[i]
         if next_cell in current_occupied and next_cell != destination:
-            new_path = bfs_path(grid_width, grid_height, position, destination, current_occupied)
+            if replan is None:
+                new_path = bfs_path(grid_width, grid_height, position, destination, current_occupied)
+            else:
+                new_path = replan(path_cells, i, position)
             if not new_path or len(new_path) < 2:
                 return position, current_time, "no_path", path_log
             path_cells = new_path
@@ -336,18 +655,70 @@ def move_along_path(path_cells, current_time, current_occupied, cell_visits,
             path_log.append({"x": position[0], "z": position[1], "time": current_time})
             return position, current_time, status, path_log
         path_log.append({"x": position[0], "z": position[1], "time": current_time})
-        cell_visits[position] += 1
+        cell_visits.visit(position, current_time)
         i += 1
     return position, current_time, "ok", path_log
 
 ####################################
-#         Симуляция магазина     #
+#     Скомпилированные клиенты    #
 ####################################
-class StoreSimulation:
-    def __init__(self, store_schema, max_queue_length=MAX_QUEUE_LENGTH_DEFAULT,
-                 grid_width=20, grid_height=20):
+class CompiledClients:
+    """
+    Клиенты, один раз приведённые к массивам перед прогоном: флаги мотива
+    "дешево" и страха "нет скидок", матрица предпочтений по товарам
+    магазина (клиент × товар) и доли бюджета по категориям магазина.
+    """
+
+    def __init__(self, cheap, no_discounts, preferences, allocation):
+        self.cheap = cheap
+        self.no_discounts = no_discounts
+        self.preferences = preferences
+        self.allocation = allocation
+
+    def __len__(self):
+        return len(self.cheap)
+
+
+def compute_purchase_bonuses(compiled, product_discount, product_category):
+    """
+    Надбавки к базовому шансу для всей матрицы клиент × товар.
+    Шанс = BASE_PURCHASE_CHANCE * качество полки + надбавка, как в compute_purchase_chance.
+    """
+    has_discount = product_discount > 0
+    bonus = np.where(compiled.cheap[:, None] & has_discount[None, :], MOTIVE_BONUS, 0.0)
+    bonus -= np.where(compiled.no_discounts[:, None] & ~has_discount[None, :], FEAR_PENALTY, 0.0)
+    bonus += np.where(has_discount, product_discount / 10.0 * DISCOUNT_BONUS, 0.0)[None, :]
+    bonus += compiled.preferences * PREFERENCE_BONUS
+    bonus += compiled.allocation[:, product_category] * BUDGET_BONUS_FACTOR
+    return bonus
+
+
+def compute_purchase_chances(compiled, product_discount, product_category, shelf_quality=1.0):
+    """Шансы покупки клиент × товар; shelf_quality — число или массив по товарам."""
+    bonus = compute_purchase_bonuses(compiled, product_discount, product_category)
+    return np.clip(BASE_PURCHASE_CHANCE * np.asarray(shelf_quality) + bonus, 0.0, 1.0)
+
+####################################
+#         Модель магазина         #
+####################################
+class StoreModel:
+    """
+    Неизменяемая часть симуляции, зависящая только от планировки магазина:
+    стеллажи, кассы, товары, статические препятствия и поля расстояний.
+    Строится один раз и разделяется между прогонами (см. app.utils.store_models).
+    Без явных grid_width/grid_height размер сетки берётся из карты (grid_bounds).
+    """
+
+    def __init__(self, store_schema, grid_width=None, grid_height=None, distance_fields=True):
         self.store_schema = store_schema
+        if grid_width is None or grid_height is None:
+            width, height = grid_bounds(store_schema)
+            grid_width = width if grid_width is None else grid_width
+            grid_height = height if grid_height is None else grid_height
+        self.grid_width = grid_width
+        self.grid_height = grid_height
         self.shelves, self.kasses, self.item_map = self.load_store(store_schema)
+        self.build_product_table()
         self.shelf_info = {}
         for shelf in store_schema['shelves']:
             x = shelf['x']
@@ -361,9 +732,18 @@ class StoreSimulation:
                 "products": shelf.get("products", []),
                 "cells": cells
             }
-        self.grid_width = grid_width
-        self.grid_height = grid_height
-        self.max_queue_length = max_queue_length
+        # Клетка -> привлекательные полки, к любой клетке которых она примыкает
+        self.spontaneous_index = {}
+        for shelf_coords, shelf_data in self.shelf_info.items():
+            if shelf_data.get("attraction", 0.5) < SPONTANEOUS_MIN_ATTRACTION:
+                continue
+            shelf_cells = set(shelf_data["cells"])
+            adjacent = set()
+            for x, z in shelf_cells:
+                for dx, dz in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+                    adjacent.add((x + dx, z + dz))
+            for cell in adjacent - shelf_cells:
+                self.spontaneous_index.setdefault(cell, []).append(shelf_coords)
         self.base_occupied_positions = set()
         for shelf in store_schema['shelves']:
             x = shelf['x']
@@ -375,25 +755,33 @@ class StoreSimulation:
                     self.base_occupied_positions.add((x + i, z + j))
         for kassa in store_schema['kasses']:
             self.base_occupied_positions.add((kassa['x'], kassa['z']))
-        self.queues = [[] for _ in self.kasses]
-        self.cell_visits = defaultdict(int)
-        self.shelf_purchases = defaultdict(int)
-        self.global_stats = {
-            "total_purchases": 0,
-            "motive_trigger_count": 0,
-            "fear_trigger_count": 0,
-            "discount_trigger_count": 0,
-            "kassa_breakdowns": 0,
-            "left_due_to_queue": 0,
-            "store_closed": 0,
-            "no_kassa": 0,
-            "no_path_to_kassa": 0,
-            "no_path_to_shelf": 0,
-            "no_start_position": 0,
-            "completed": 0
-        }
-        self.current_occupied = set(self.base_occupied_positions)
-        self.state_lock = asyncio.Lock()
+        self.shelf_layout = ShelfLayout(grid_width, grid_height, store_schema['shelves'])
+        self.obstacles = obstacle_mask(grid_width, grid_height, self.base_occupied_positions)
+        # Стеллажи и кассы не двигаются: поле расстояний до каждого считается
+        # один раз, при первом пути к нему
+        self.distance_fields = {}
+        if distance_fields:
+            self.distance_fields = DistanceFields(grid_width, grid_height, self.obstacles,
+                                                  list(self.shelf_info) + self.kasses)
+        self.corridor_graph = None
+        self.route_matrix = None
+
+    def routes(self):
+        """Матрица расстояний между стеллажами с товарами и до касс для route_order="tsp"."""
+        if self.route_matrix is None:
+            shelves = list(dict.fromkeys(cells[0] for _, cells, _ in self.item_map.values()))
+            if isinstance(self.distance_fields, DistanceFields):
+                field_for = self.distance_fields.get
+            else:
+                field_for = lambda target: DistanceField(self.grid_width, self.grid_height, self.obstacles, target)
+            self.route_matrix = RouteMatrix(shelves, self.kasses, field_for)
+        return self.route_matrix
+
+    def corridors(self):
+        """Граф проходов планировки; строится при первом прогоне с planner="corridors"."""
+        if self.corridor_graph is None:
+            self.corridor_graph = CorridorGraph(self.grid_width, self.grid_height, self.obstacles)
+        return self.corridor_graph
 
     def load_store(self, store_schema):
         shelves = {}
@@ -421,6 +809,203 @@ class StoreSimulation:
             kasses.append((kassa['x'], kassa['z']))
         return shelves, kasses, item_map
 
+    def build_product_table(self):
+        # Товары магазина в виде массивов: индекс товара = позиция в item_map
+        self.product_names = list(self.item_map)
+        self.product_index = {name: i for i, name in enumerate(self.product_names)}
+        self.store_categories = list(dict.fromkeys(cat for cat, _, _ in self.item_map.values()))
+        category_index = {cat: i for i, cat in enumerate(self.store_categories)}
+        self.product_category = np.array(
+            [category_index[cat] for cat, _, _ in self.item_map.values()], dtype=np.int64)
+        self.product_discount = np.array(
+            [info.get('percent_discount') or 0 for _, _, info in self.item_map.values()], dtype=float)
+
+####################################
+#         Симуляция магазина     #
+####################################
+class StoreSimulation:
+    # Поля StoreModel, которые симуляция читает как свои атрибуты
+    MODEL_FIELDS = (
+        "store_schema", "grid_width", "grid_height", "shelves", "kasses", "item_map",
+        "shelf_info", "spontaneous_index", "base_occupied_positions", "distance_fields", "shelf_layout",
+        "product_names", "product_index", "store_categories", "product_category", "product_discount",
+    )
+
+    def __init__(self, store_schema, max_queue_length=MAX_QUEUE_LENGTH_DEFAULT,
+                 grid_width=None, grid_height=None, grid_engine="set", distance_fields=True,
+                 planner="astar", model=None, trajectory_format="json", popular_zones_limit=None,
+                 heatmap_bucket_seconds=None, route_order="list"):
+        if grid_engine not in GRID_ENGINES:
+            raise ValueError(f"Неизвестный движок сетки: {grid_engine}")
+        if planner not in PLANNERS:
+            raise ValueError(f"Неизвестный планировщик: {planner}")
+        if trajectory_format not in TRAJECTORY_FORMATS:
+            raise ValueError(f"Неизвестный формат траекторий: {trajectory_format}")
+        if route_order not in ROUTE_ORDERS:
+            raise ValueError(f"Неизвестный порядок обхода: {route_order}")
+        self.grid_engine = grid_engine
+        self.route_order = route_order
+        self.planner = planner
+        self.trajectory_format = trajectory_format
+        if model is None:
+            model = StoreModel(store_schema, grid_width, grid_height, distance_fields)
+        self.model = model
+        for field in self.MODEL_FIELDS:
+            setattr(self, field, getattr(model, field))
+        self.max_queue_length = max_queue_length
+        self.queues = [[] for _ in self.kasses]
+        # Посещения по интервалам времени копятся вместе с общими, если задан интервал
+        self.heatmap = None
+        if heatmap_bucket_seconds:
+            self.heatmap = TimeBucketHeatmap(self.grid_width, self.grid_height, heatmap_bucket_seconds,
+                                             OPEN_TIME_SECONDS, CLOSE_TIME_SECONDS)
+        self.cell_visits = CellCounter(self.grid_width, self.grid_height, timeline=self.heatmap)
+        self.shelf_purchases = CellCounter(self.grid_width, self.grid_height)
+        # Сколько самых посещаемых клеток отдавать в popular_zones (None — все)
+        self.popular_zones_limit = popular_zones_limit
+        self.global_stats = {
+            "total_purchases": 0,
+            "motive_trigger_count": 0,
+            "fear_trigger_count": 0,
+            "discount_trigger_count": 0,
+            "kassa_breakdowns": 0,
+            "left_due_to_queue": 0,
+            "store_closed": 0,
+            "no_kassa": 0,
+            "no_path_to_kassa": 0,
+            "no_path_to_shelf": 0,
+            "no_start_position": 0,
+            "completed": 0,
+            "path_expansions": 0,
+            "replans": 0,
+            "local_repairs": 0
+        }
+        if grid_engine == "array":
+            self.current_occupied = OccupancyGrid(self.grid_width, self.grid_height, self.base_occupied_positions)
+        else:
+            self.current_occupied = set(self.base_occupied_positions)
+        self.purchase_bonus = None
+        self.approachable = None
+        self.client_rows = {}
+        self.state_lock = asyncio.Lock()
+
+    def finish_path(self, path_log):
+        # Журнал шагов сжимается сразу по завершении клиента, до сборки отчёта
+        if self.trajectory_format == "compact":
+            from app.utils.trajectories import encode_trajectory
+            return encode_trajectory(path_log)
+        return path_log
+
+    def compile_clients(self, clients):
+        if isinstance(clients, CustomerBatch):
+            return self._compile_batch(clients)
+        n = len(clients)
+        cheap = np.zeros(n, dtype=bool)
+        no_discounts = np.zeros(n, dtype=bool)
+        preferences = np.zeros((n, len(self.product_names)), dtype=bool)
+        allocation = np.zeros((n, len(self.store_categories)))
+        for i, client in enumerate(clients):
+            cheap[i] = any("дешево" in m.lower() for m in client.get('motives', []))
+            no_discounts[i] = any("нет скидок" in f.lower() for f in client.get('fears', []))
+            for p in client.get('preferences', []):
+                idx = self.product_index.get(p.lower())
+                if idx is not None:
+                    preferences[i, idx] = True
+            budget = client.get('budget_allocation', {})
+            allocation[i] = [budget.get(cat, 0) for cat in self.store_categories]
+        return CompiledClients(cheap, no_discounts, preferences, allocation)
+
+    def _compile_batch(self, batch):
+        segments = batch.generator.segments
+        # Флаги считаются по сегменту и маске выбранных мотивов/страхов, без строк по клиентам
+        width = batch.motive_mask.shape[1]
+        cheap_flags = np.array([[j < len(s["motives"]) and "дешево" in s["motives"][j].lower()
+                                 for j in range(width)] for s in segments])
+        width = batch.fear_mask.shape[1]
+        fear_flags = np.array([[j < len(s["fears"]) and "нет скидок" in s["fears"][j].lower()
+                                for j in range(width)] for s in segments])
+        segment = batch.segment.astype(np.int64)
+        cheap = (batch.motive_mask & cheap_flags[segment]).any(axis=1)
+        no_discounts = (batch.fear_mask & fear_flags[segment]).any(axis=1)
+        preferences = np.zeros((len(batch), len(self.product_names)), dtype=bool)
+        for v, name in enumerate(batch.product_names):
+            idx = self.product_index.get(name.lower())
+            if idx is not None:
+                preferences[:, idx] |= batch.preference_mask[:, v]
+        segment_allocation = np.array([[s["budget_allocation"].get(cat, 0) for cat in self.store_categories]
+                                       for s in segments]).reshape(len(segments), len(self.store_categories))
+        return CompiledClients(cheap, no_discounts, preferences, segment_allocation[segment])
+
+    def prepare_clients(self, clients):
+        """
+        Компилирует клиентов и считает надбавки к шансу покупки для всех пар
+        клиент × товар. Товары, к которым клиент не подойдёт даже у
+        посещаемой полки, отсекаются ещё до поиска пути.
+        """
+        compiled = self.compile_clients(clients)
+        self.purchase_bonus = compute_purchase_bonuses(compiled, self.product_discount, self.product_category)
+        best_chance = np.clip(BASE_PURCHASE_CHANCE + self.purchase_bonus, 0.0, 1.0)
+        self.approachable = best_chance >= MIN_CHANCE_TO_APPROACH
+        self.client_rows = {id(client): i for i, client in enumerate(clients)}
+
+    def plan_route(self, client, position):
+        """
+        Порядок обхода списка покупок. С route_order="tsp" товары, к которым
+        клиент может подойти, переставляются в кратчайший маршрут от его
+        позиции до кассы; остальные всё равно будут пропущены и идут в конце.
+        """
+        items = list(client.get('shopping_list', []))
+        if self.route_order == "list" or len(items) < 2:
+            return items
+        row = self.client_rows.get(id(client))
+        stops = []
+        rest = []
+        for item in items:
+            entry = self.item_map.get(item.lower())
+            if entry is None or (row is not None and not self.approachable[row, self.product_index[item.lower()]]):
+                rest.append(item)
+            else:
+                stops.append((item, entry[1][0]))
+        return order_stops(self.model.routes(), position, stops) + rest
+
+    def find_path(self, start, end):
+        if self.planner == "corridors":
+            path = self.model.corridors().path(start, end, stats=self.global_stats)
+            # Клиентов дальше по пути обходим локально при движении (replan): пока
+            # дойдём, они могут уйти. Поиск по клеткам — только если занят первый шаг
+            if path is None or len(path) < 2 or path[1] == end or path[1] not in self.current_occupied:
+                return path
+            return astar_path(self.grid_width, self.grid_height, start, end, self.current_occupied,
+                              stats=self.global_stats)
+        field = self.distance_fields.get(end)
+        if field is not None:
+            path = field.path_from(start)
+            # Статический путь годится, если его не перегородили другие клиенты
+            if path is not None and not any(cell in self.current_occupied for cell in path[1:-1]):
+                return path
+        if self.planner != "bfs":
+            return astar_path(self.grid_width, self.grid_height, start, end, self.current_occupied,
+                              stats=self.global_stats)
+        if self.grid_engine == "array":
+            grid = self.current_occupied
+            before = grid.expansions
+            path = grid.bfs_path(start, end)
+            self.global_stats["path_expansions"] += grid.expansions - before
+            return path
+        return bfs_path(self.grid_width, self.grid_height, start, end, self.current_occupied,
+                        stats=self.global_stats)
+
+    def replan(self, path_cells, i, position):
+        # Следующая клетка маршрута занята: сначала пробуем короткий обход
+        self.global_stats["replans"] += 1
+        if self.planner != "bfs":
+            path = repair_path(path_cells, i, position, self.current_occupied,
+                               self.grid_width, self.grid_height, stats=self.global_stats)
+            if path is not None:
+                self.global_stats["local_repairs"] += 1
+                return path
+        return self.find_path(position, path_cells[-1])
+
     def compute_purchase_chance(self, client, cat, product_info, shelf_quality=1.0):
         chance = BASE_PURCHASE_CHANCE * shelf_quality
         if any("дешево" in m.lower() for m in client.get('motives', [])):
@@ -441,6 +1026,95 @@ class StoreSimulation:
         chance += allocation_bonus
         return max(0.0, min(1.0, chance))
 
+    def find_start_position(self):
+        position = (0, 0)
+        if position not in self.current_occupied:
+            return position
+        for dx in range(self.grid_width):
+            candidate = (dx, 0)
+            if candidate not in self.current_occupied:
+                return candidate
+        return None
+
+    def evaluate_item(self, client, item):
+        """Решение подойти к полке: (категория, клетки полки, товар, шанс) или None."""
+        item_lower = item.lower()
+        if item_lower not in self.item_map:
+            return None
+        cat, shelf_cells, product_info = self.item_map[item_lower]
+        row = self.client_rows.get(id(client))
+        if row is not None:
+            product = self.product_index[item_lower]
+            if not self.approachable[row, product]:
+                return None
+        visits = sum(self.cell_visits.get(cell, 0) for cell in shelf_cells) / len(shelf_cells)
+        shelf_quality = 0.7 if visits < 5 else 1.0
+        if row is None:
+            chance = self.compute_purchase_chance(client, cat, product_info, shelf_quality)
+        else:
+            chance = BASE_PURCHASE_CHANCE * shelf_quality + float(self.purchase_bonus[row, product])
+            chance = max(0.0, min(1.0, chance))
+        if chance < MIN_CHANCE_TO_APPROACH:
+            return None
+        return cat, shelf_cells, product_info, chance
+
+    def visit_shelf(self, item, cat, shelf_cells, chance, position, current_time, path_log, purchases_log):
+        path_log[-1]["event"] = f"arrived_shelf ({cat})"
+        purchased = random.random() < chance
+        purchase_record = {"item": item, "x": position[0], "z": position[1], "time": current_time, "chance": chance, "purchased": purchased}
+        purchases_log.append(purchase_record)
+        if purchased:
+            self.global_stats["total_purchases"] += 1
+            for cell in shelf_cells:
+                self.shelf_purchases[cell] += 1
+            path_log[-1]["purchase_item"] = item
+            path_log[-1]["purchase_chance"] = round(chance, 3)
+            path_log[-1]["event"] += f"; PURCHASED: {item}"
+        else:
+            path_log[-1]["purchase_item"] = item
+            path_log[-1]["purchase_chance"] = round(chance, 3)
+            path_log[-1]["event"] += f"; DID_NOT_BUY: {item}"
+
+        # Спонтанные покупки для соседних полок
+        for shelf_coords in self.spontaneous_index.get(position, ()):
+            if shelf_coords == shelf_cells[0]:
+                continue
+            shelf_data = self.shelf_info[shelf_coords]
+            spontaneous_chance = SPONTANEOUS_BASE_CHANCE * shelf_data.get("attraction", 0.5)
+            if random.random() < spontaneous_chance:
+                if shelf_data.get("products"):
+                    product = random.choice(shelf_data["products"])
+                    purchase_record = {
+                        "item": product.get("name", "unknown"),
+                        "x": shelf_coords[0],
+                        "z": shelf_coords[1],
+                        "time": current_time,
+                        "chance": spontaneous_chance,
+                        "purchased": True,
+                        "spontaneous": True
+                    }
+                    purchases_log.append(purchase_record)
+                    self.global_stats["total_purchases"] += 1
+                    for cell in shelf_data["cells"]:
+                        self.shelf_purchases[cell] += 1
+                    path_log.append({
+                        "x": shelf_coords[0],
+                        "z": shelf_coords[1],
+                        "time": current_time,
+                        "event": f"spontaneous_purchase: {product.get('name', 'unknown')}"
+                    })
+
+    def choose_kassa(self, position):
+        best_score = None
+        chosen_kassa = None
+        for i, kassa_pos in enumerate(self.kasses):
+            dist = manhattan_distance(position, kassa_pos)
+            score = dist + len(self.queues[i])
+            if best_score is None or score < best_score:
+                best_score = score
+                chosen_kassa = i
+        return chosen_kassa
+
     async def simulate_client(self, client, wait_for_arrival=True):
         if wait_for_arrival:
             await asyncio.sleep((client['arrival_time'] - OPEN_TIME_SECONDS) * SIMULATION_SCALE)
@@ -448,45 +1122,32 @@ class StoreSimulation:
         status = "completed"
         path_log = []
         purchases_log = []
-        position = (0, 0)
         async with self.state_lock:
-            if position in self.current_occupied:
-                found_alt = False
-                for dx in range(self.grid_width):
-                    candidate = (dx, 0)
-                    if candidate not in self.current_occupied:
-                        position = candidate
-                        found_alt = True
-                        break
-                if not found_alt:
-                    self.global_stats["no_start_position"] += 1
-                    return {"client": client['name'], "path": path_log, "purchases": purchases_log, "end_time": current_time, "status": "no_start_position"}
+            position = self.find_start_position()
+            if position is None:
+                self.global_stats["no_start_position"] += 1
+                return {"client": client['name'], "path": self.finish_path(path_log), "purchases": purchases_log, "end_time": current_time, "status": "no_start_position"}
             self.current_occupied.add(position)
         path_log.append({"x": position[0], "z": position[1], "time": current_time, "event": "entered_store"})
-        self.cell_visits[position] += 1
+        self.cell_visits.visit(position, current_time)
 
-        for item in client.get('shopping_list', []):
+        for item in self.plan_route(client, position):
             if current_time > CLOSE_TIME_SECONDS:
                 status = "store_closed"
                 self.global_stats["store_closed"] += 1
                 break
-            item_lower = item.lower()
-            if item_lower not in self.item_map:
-                continue
-            cat, shelf_cells, product_info = self.item_map[item_lower]
-            visits = sum(self.cell_visits.get(cell, 0) for cell in shelf_cells) / len(shelf_cells)
-            shelf_quality = 0.7 if visits < 5 else 1.0
-            chance = self.compute_purchase_chance(client, cat, product_info, shelf_quality)
-            if chance < MIN_CHANCE_TO_APPROACH:
+            decision = self.evaluate_item(client, item)
+            if decision is None:
                 continue
+            cat, shelf_cells, product_info, chance = decision
             async with self.state_lock:
                 target_cell = shelf_cells[0]
-                path_cells = bfs_path(self.grid_width, self.grid_height, position, target_cell, self.current_occupied)
+                path_cells = self.find_path(position, target_cell)
                 if not path_cells:
                     status = "no_path_to_shelf"
                     self.global_stats["no_path_to_shelf"] += 1
                     break
-                final_pos, new_time, st, move_log = move_along_path(path_cells, current_time, self.current_occupied, self.cell_visits, self.grid_width, self.grid_height)
+                final_pos, new_time, st, move_log = move_along_path(path_cells, current_time, self.current_occupied, self.cell_visits, self.grid_width, self.grid_height, replan=self.replan)
                 position = final_pos
                 current_time = new_time
                 path_log.extend(move_log[1:])
@@ -495,62 +1156,11 @@ class StoreSimulation:
                 self.global_stats[status] += 1
                 break
 
-            path_log[-1]["event"] = f"arrived_shelf ({cat})"
-            purchased = random.random() < chance
-            purchase_record = {"item": item, "x": position[0], "z": position[1], "time": current_time, "chance": chance, "purchased": purchased}
-            purchases_log.append(purchase_record)
-            if purchased:
-                self.global_stats["total_purchases"] += 1
-                for cell in shelf_cells:
-                    self.shelf_purchases[cell] += 1
-                path_log[-1]["purchase_item"] = item
-                path_log[-1]["purchase_chance"] = round(chance, 3)
-                path_log[-1]["event"] += f"; PURCHASED: {item}"
-            else:
-                path_log[-1]["purchase_item"] = item
-                path_log[-1]["purchase_chance"] = round(chance, 3)
-                path_log[-1]["event"] += f"; DID_NOT_BUY: {item}"
-
-            # Спонтанные покупки для соседних полок
-            for shelf_coords, shelf_data in self.shelf_info.items():
-                if shelf_coords == shelf_cells[0]:
-                    continue
-                if manhattan_distance(position, shelf_coords) == 1:
-                    if shelf_data.get("attraction", 0.5) >= 0.7:
-                        spontaneous_chance = SPONTANEOUS_BASE_CHANCE * shelf_data.get("attraction", 0.5)
-                        if random.random() < spontaneous_chance:
-                            if shelf_data.get("products"):
-                                product = random.choice(shelf_data["products"])
-                                purchase_record = {
-                                    "item": product.get("name", "unknown"),
-                                    "x": shelf_coords[0],
-                                    "z": shelf_coords[1],
-                                    "time": current_time,
-                                    "chance": spontaneous_chance,
-                                    "purchased": True,
-                                    "spontaneous": True
-                                }
-                                purchases_log.append(purchase_record)
-                                self.global_stats["total_purchases"] += 1
-                                for cell in shelf_data["cells"]:
-                                    self.shelf_purchases[cell] += 1
-                                path_log.append({
-                                    "x": shelf_coords[0],
-                                    "z": shelf_coords[1],
-                                    "time": current_time,
-                                    "event": f"spontaneous_purchase: {product.get('name', 'unknown')}"
-                                })
+            self.visit_shelf(item, cat, shelf_cells, chance, position, current_time, path_log, purchases_log)
 
         if status not in ("store_closed", "no_path_to_shelf"):
             async with self.state_lock:
-                best_score = None
-                chosen_kassa = None
-                for i, kassa_pos in enumerate(self.kasses):
-                    dist = manhattan_distance(position, kassa_pos)
-                    score = dist + len(self.queues[i])
-                    if best_score is None or score < best_score:
-                        best_score = score
-                        chosen_kassa = i
+                chosen_kassa = self.choose_kassa(position)
                 if chosen_kassa is None:
                     status = "no_kassa"
                     self.global_stats["no_kassa"] += 1
@@ -560,18 +1170,18 @@ class StoreSimulation:
                         status = "kassa_broken"
                         path_log.append({"x": position[0], "z": position[1], "time": current_time, "event": "kassa_broken"})
                         self.current_occupied.remove(position)
-                        return {"client": client['name'], "path": path_log, "purchases": purchases_log, "end_time": current_time, "status": status}
+                        return {"client": client['name'], "path": self.finish_path(path_log), "purchases": purchases_log, "end_time": current_time, "status": status}
                     if len(self.queues[chosen_kassa]) >= self.max_queue_length:
                         status = "left_due_to_queue"
                         self.global_stats["left_due_to_queue"] += 1
                     else:
                         kassa_pos = self.kasses[chosen_kassa]
-                        path_cells = bfs_path(self.grid_width, self.grid_height, position, kassa_pos, self.current_occupied)
+                        path_cells = self.find_path(position, kassa_pos)
                         if not path_cells:
                             status = "no_path_to_kassa"
                             self.global_stats["no_path_to_kassa"] += 1
                         else:
-                            final_pos, new_time, st, move_log = move_along_path(path_cells, current_time, self.current_occupied, self.cell_visits, self.grid_width, self.grid_height)
+                            final_pos, new_time, st, move_log = move_along_path(path_cells, current_time, self.current_occupied, self.cell_visits, self.grid_width, self.grid_height, replan=self.replan)
                             position = final_pos
                             current_time = new_time
                             path_log.extend(move_log[1:])
@@ -593,25 +1203,32 @@ class StoreSimulation:
                 self.current_occupied.remove(position)
         if status == "completed":
             self.global_stats["completed"] += 1
-        return {"client": client['name'], "path": path_log, "purchases": purchases_log, "end_time": current_time, "status": status}
+        return {"client": client['name'], "path": self.finish_path(path_log), "purchases": purchases_log, "end_time": current_time, "status": status}
 
-    async def simulate_clients(self, clients):
-        total_clients = len(clients)
+    def assign_arrival_times(self, clients):
+        """Раскидывает клиентов по утру, пику 12:00–14:00 и вечеру; возвращает их по времени прихода."""
         peak_start = 12 * 3600
         peak_end = 14 * 3600
         peak_clients = [c for c in clients if random.random() < 0.4]
-        non_peak_clients = [c for c in clients if c not in peak_clients]
+        peak_ids = {id(c) for c in peak_clients}
+        non_peak_clients = [c for c in clients if id(c) not in peak_ids]
         for client in peak_clients:
             client.update({'arrival_time': random.uniform(peak_start, peak_end)})
-        open_time = OPEN_TIME_SECONDS
-        close_time = CLOSE_TIME_SECONDS
         morning = [c for c in non_peak_clients if random.random() < 0.5]
-        evening = [c for c in non_peak_clients if c not in morning]
+        morning_ids = {id(c) for c in morning}
+        evening = [c for c in non_peak_clients if id(c) not in morning_ids]
         for client in morning:
-            client['arrival_time'] = random.uniform(open_time, peak_start)
+            client['arrival_time'] = random.uniform(OPEN_TIME_SECONDS, peak_start)
         for client in evening:
-            client['arrival_time'] = random.uniform(peak_end, close_time)
-        clients_sorted = sorted(clients, key=lambda c: c['arrival_time'])
+            client['arrival_time'] = random.uniform(peak_end, CLOSE_TIME_SECONDS)
+        return sorted(clients, key=lambda c: c['arrival_time'])
+
+    async def simulate_clients(self, clients):
+        peak_start = 12 * 3600
+        peak_end = 14 * 3600
+        open_time = OPEN_TIME_SECONDS
+        self.prepare_clients(clients)
+        clients_sorted = self.assign_arrival_times(clients)
         def group_clients(client_list, group_size):
             groups = []
             for i in range(0, len(client_list), group_size):
@@ -632,8 +1249,11 @@ class StoreSimulation:
             group_results = await asyncio.gather(*tasks)
             results.extend(group_results)
             last_group_avg = group_avg
+        return self.build_report(len(clients), results)
+
+    def build_report(self, total_clients, results):
         stats = {
-            "total_clients": len(clients),
+            "total_clients": total_clients,
             "completed": self.global_stats["completed"],
             "left_due_to_queue": self.global_stats["left_due_to_queue"],
             "store_closed": self.global_stats["store_closed"],
@@ -645,22 +1265,19 @@ class StoreSimulation:
             "motive_trigger_count": self.global_stats["motive_trigger_count"],
             "fear_trigger_count": self.global_stats["fear_trigger_count"],
             "discount_trigger_count": self.global_stats["discount_trigger_count"],
-            "kassa_breakdowns": self.global_stats["kassa_breakdowns"]
+            "kassa_breakdowns": self.global_stats["kassa_breakdowns"],
+            "path_expansions": self.global_stats["path_expansions"],
+            "replans": self.global_stats["replans"],
+            "local_repairs": self.global_stats["local_repairs"]
         }
-        popular_zones = sorted(
-            [{"x": k[0], "z": k[1], "visits": v} for k, v in self.cell_visits.items()],
-            key=lambda d: d['visits'],
-            reverse=True
-        )
+        popular_zones = [
+            {"x": pos[0], "z": pos[1], "visits": visits}
+            for pos, visits in self.cell_visits.top(self.popular_zones_limit)
+        ]
+        shelf_visits, shelf_purchases = self.shelf_totals()
         shelf_statistics = {}
-        for shelf in self.store_schema.get("shelves", []):
-            x = shelf["x"]
-            z = shelf["z"]
-            width = shelf.get("width", 3)
-            depth = shelf.get("depth", 1)
-            cells = [(x + i, z + j) for i in range(width) for j in range(depth)]
-            visits = sum(self.cell_visits.get(cell, 0) for cell in cells)
-            purchases = sum(self.shelf_purchases.get(cell, 0) for cell in cells)
+        shelves = self.store_schema.get("shelves", [])
+        for shelf, cells, visits, purchases in zip(shelves, self.shelf_layout.cells, shelf_visits.tolist(), shelf_purchases.tolist()):
             conversion = (purchases / visits) if visits > 0 else 0
             shelf_statistics[str(cells[0])] = {
                 "category": shelf["category"],
@@ -671,13 +1288,20 @@ class StoreSimulation:
             }
         recommendations = self.generate_recommendations(stats, popular_zones)
         print(stats)
-        return {
+        report = {
             "results": results,
             "statistics": stats,
             "shelf_statistics": shelf_statistics,
             "popular_zones": popular_zones,
             "recommendations": recommendations
         }
+        if self.heatmap is not None:
+            report["heatmap"] = self.heatmap.to_compact()
+        return report
+
+    def shelf_totals(self):
+        # Посещения и покупки по стеллажам в порядке store_schema['shelves']
+        return self.shelf_layout.totals(self.cell_visits), self.shelf_layout.totals(self.shelf_purchases)
 
     def generate_recommendations(self, stats, popular_zones):
         recommendations = []
@@ -685,38 +1309,12 @@ class StoreSimulation:
             recommendations.append("Некоторые клиенты уходят из-за очереди на кассе. Рекомендуется увеличить длину очереди или добавить дополнительную кассу.")
         if stats["kassa_breakdowns"] > 0:
             recommendations.append("Обнаружены сбои в работе касс. Проверьте оборудование или распределение нагрузки.")
-        shelf_statistics = {}
-        total_visits = 0
-        total_purchases = 0
-        shelf_count = 0
-        for shelf in self.store_schema.get("shelves", []):
-            x = shelf["x"]
-            z = shelf["z"]
-            width = shelf.get("width", 3)
-            depth = shelf.get("depth", 1)
-            cells = [(x + i, z + j) for i in range(width) for j in range(depth)]
-            visits = sum(self.cell_visits.get(cell, 0) for cell in cells)
-            purchases = sum(self.shelf_purchases.get(cell, 0) for cell in cells)
-            conversion = (purchases / visits) if visits > 0 else 0
-            shelf_statistics[str(cells[0])] = {
-                "category": shelf["category"],
-                "cells": cells,
-                "visits": visits,
-                "purchases": purchases,
-                "conversion_rate": round(conversion, 3)
-            }
-            total_visits += visits
-            total_purchases += purchases
-            shelf_count += 1
-        average_visits = total_visits / shelf_count if shelf_count > 0 else 0
-        for shelf in self.store_schema.get("shelves", []):
-            x = shelf["x"]
-            z = shelf["z"]
-            width = shelf.get("width", 3)
-            depth = shelf.get("depth", 1)
-            cells = [(x + i, z + j) for i in range(width) for j in range(depth)]
-            visits = sum(self.cell_visits.get(cell, 0) for cell in cells)
-            purchases = sum(self.shelf_purchases.get(cell, 0) for cell in cells)
+        shelves = self.store_schema.get("shelves", [])
+        shelf_visits, shelf_purchases = self.shelf_totals()
+        total_visits = int(shelf_visits.sum())
+        total_purchases = int(shelf_purchases.sum())
+        average_visits = total_visits / len(shelves) if shelves else 0
+        for shelf, cells, visits, purchases in zip(shelves, self.shelf_layout.cells, shelf_visits.tolist(), shelf_purchases.tolist()):
             conversion = (purchases / visits) if visits > 0 else 0
             products = shelf.get("products", [])
             avg_discount = sum((p.get("percent_discount") or 0) for p in products) / len(products) if products else 0
@@ -734,30 +1332,84 @@ class StoreSimulation:
 ###################################
 # Пример запуска
 ###################################
-async def main(count, store_data, categories_data):
+def convert_np(obj):
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return obj
+
+
+def generate_clients(count, seed=42):
+    """
+    Клиенты прогона. Зависят только от count и seed, поэтому после прогона
+    их профили можно построить заново, например для записи в БД.
+    """
+    return CustomerGenerator().generate_batch(count, np.random.default_rng(seed))
+
+
+def _prepare_run(count, store_data, model, seed, trajectory_format="json", heatmap_bucket_seconds=None,
+                 route_order="list", popular_zones_limit=None):
+    # Импорт здесь: модуль событийного движка сам импортирует simulations
+    from app.utils.event_simulation import EventDrivenSimulation
+    random.seed(seed)
+    clients = generate_clients(count, seed)
+    sim = EventDrivenSimulation(store_data, model=model, trajectory_format=trajectory_format,
+                                heatmap_bucket_seconds=heatmap_bucket_seconds, route_order=route_order,
+                                popular_zones_limit=popular_zones_limit)
+    return sim, clients
+
+
+def run_simulation(count, store_data, model=None, seed=42, progress=None, trajectory_format="json",
+                   heatmap_bucket_seconds=None, route_order="list", popular_zones_limit=None):
+    """
+    Синхронный прогон дня событийным движком с тем же seed, что и main.
+    progress(done, total) вызывается по мере завершения клиентов.
+    """
+    sim, clients = _prepare_run(count, store_data, model, seed, trajectory_format, heatmap_bucket_seconds,
+                                route_order, popular_zones_limit)
+    results = []
+    for result in sim.iter_results(clients):
+        results.append(result)
+        if progress is not None:
+            progress(len(results), count)
+    return sim.build_report(count, results)
+
+
+def stream_simulation(count, store_data, model=None, seed=42, trajectory_format="json",
+                      heatmap_bucket_seconds=None, route_order="list", popular_zones_limit=None):
+    """
+    Прогон дня в виде NDJSON: строка {"type": "client", ...} на каждого
+    клиента сразу по его завершении, в конце строка {"type": "summary"}
+    со статистикой и рекомендациями. Результаты клиентов не накапливаются.
+    """
+    sim, clients = _prepare_run(count, store_data, model, seed, trajectory_format, heatmap_bucket_seconds,
+                                route_order, popular_zones_limit)
+    for result in sim.iter_results(clients):
+        line = json.dumps({"type": "client", **result}, ensure_ascii=False, default=convert_np)
+        yield line + "\n"
+    report = sim.build_report(count, None)
+    del report["results"]
+    yield json.dumps({"type": "summary", **report}, ensure_ascii=False, default=convert_np) + "\n"
+
+
+async def main(count, store_data, engine="events", model=None, trajectory_format="json",
+               heatmap_bucket_seconds=None, route_order="list", popular_zones_limit=None):
     random.seed(42)
-    generator = CustomerGenerator()
-    clients = await generator.generate_customers(count)
-    sim = StoreSimulation(store_data)
+    clients = generate_clients(count, 42)
+    if engine == "events":
+        # Импорт здесь: модуль событийного движка сам импортирует simulations
+        from app.utils.event_simulation import EventDrivenSimulation
+        sim = EventDrivenSimulation(store_data, model=model, trajectory_format=trajectory_format,
+                                    heatmap_bucket_seconds=heatmap_bucket_seconds, route_order=route_order,
+                                    popular_zones_limit=popular_zones_limit)
+    else:
+        sim = StoreSimulation(store_data, model=model, trajectory_format=trajectory_format,
+                              heatmap_bucket_seconds=heatmap_bucket_seconds, route_order=route_order,
+                              popular_zones_limit=popular_zones_limit)
     results = await sim.simulate_clients(clients)
-    def convert_np(obj):
-        if isinstance(obj, np.integer):
-            return int(obj)
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-        return obj
-
-    pon = {}
-    for category in categories_data:
-        # "Фрукты": {"products": [
-        #         "яблоки", "бананы", "груши", "апельсины", "киви",
-        #         "виноград", "мандарины", "ананас", "манго", "гранат"
-        #     ]},
-
-        pon.update({category["name"]: {"products": category["products"]}})
-        
-    generator.product_categories = pon
-    print(generator.product_categories)
     return json.dumps(results, ensure_ascii=False, indent=2, default=convert_np)
 
 if __name__ == '__main__':
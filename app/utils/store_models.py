@@ -0,0 +1,95 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from app.schemas import maps as map_schemas
+from app.utils.simulations import StoreModel
+
+# Сколько скомпилированных магазинов держим в памяти процесса
+STORE_MODEL_CACHE_SIZE = 32
+
+
+def build_store_schema(map_):
+    """
+    Схема магазина для StoreSimulation из уже загруженной карты
+    (Maps.get_by_id подгружает стеллажи с товарами и кассы).
+    Совпадает с ответом GET /maps/{map_id}/full, но без HTTP-запроса к себе.
+    """
+    store_schema = map_schemas.MapShelves.model_validate(map_, from_attributes=True).model_dump(mode="json")
+    store_schema["kasses"] = store_schema.pop("kassses")
+    return store_schema
+
+
+def schema_hash(store_schema):
+    """Хэш содержимого карты: размеры, стеллажи, товары и кассы."""
+    content = {
+        "x": store_schema.get("x"),
+        "z": store_schema.get("z"),
+        "shelves": store_schema.get("shelves", []),
+        "kasses": store_schema.get("kasses", []),
+    }
+    raw = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class StoreModelCache:
+    """
+    LRU-кэш скомпилированных моделей магазина по ключу (map_id, хэш содержимого).
+
+    Хэш защищает от устаревших моделей, даже если карту изменили в обход API;
+    invalidate(map_id) вызывается из эндпоинтов изменения карты и сразу
+    освобождает память.
+    """
+
+    def __init__(self, maxsize=STORE_MODEL_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.models = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def get(self, map_id, store_schema, **options):
+        key = (map_id, schema_hash(store_schema), tuple(sorted(options.items())))
+        with self.lock:
+            model = self.models.get(key)
+            if model is not None:
+                self.models.move_to_end(key)
+                self.hits += 1
+                return model
+            self.misses += 1
+        model = StoreModel(store_schema, **options)
+        with self.lock:
+            self.models[key] = model
+            self.models.move_to_end(key)
+            while len(self.models) > self.maxsize:
+                self.models.popitem(last=False)
+        return model
+
+    def invalidate(self, map_id):
+        with self.lock:
+            stale = [key for key in self.models if key[0] == map_id]
+            for key in stale:
+                del self.models[key]
+            self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.models.clear()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.models),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / total if total else 0.0,
+                "maps": sorted({key[0] for key in self.models}),
+            }
+
+
+store_model_cache = StoreModelCache()
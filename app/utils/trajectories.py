@@ -0,0 +1,128 @@
+import base64
+import io
+import json
+
+import numpy as np
+
+from app.utils.simulations import BLOCK_TIME_SECONDS
+
+# Поля шага, которые кодируются массивами; всё остальное уходит в разреженные события
+STEP_FIELDS = ("x", "z", "time")
+
+
+def _pack(values):
+    return base64.b64encode(np.asarray(values, dtype="<i2").tobytes()).decode("ascii")
+
+
+def _unpack(data):
+    return np.frombuffer(base64.b64decode(data), dtype="<i2")
+
+
+def encode_trajectory(path_log):
+    """
+    Сжимает журнал шагов клиента: старт, дельты x/z в int16, время только
+    там, где оно отличается от предыдущего + BLOCK_TIME_SECONDS, и
+    разреженный список событий (поля шага кроме x, z, time).
+    Координаты клеток целые, поэтому 2.0 после декодирования станет 2.
+    """
+    if not path_log:
+        return {"steps": 0}
+    xs = np.fromiter((int(step["x"]) for step in path_log), dtype=np.int64, count=len(path_log))
+    zs = np.fromiter((int(step["z"]) for step in path_log), dtype=np.int64, count=len(path_log))
+    time_jumps = []
+    events = []
+    prev_time = None
+    for i, step in enumerate(path_log):
+        t = step["time"]
+        if prev_time is not None and t != prev_time + BLOCK_TIME_SECONDS:
+            time_jumps.append([i, t])
+        prev_time = t
+        extra = {key: value for key, value in step.items() if key not in STEP_FIELDS}
+        if extra:
+            events.append([i, extra])
+    return {
+        "steps": len(path_log),
+        "start_time": path_log[0]["time"],
+        "x0": int(xs[0]),
+        "z0": int(zs[0]),
+        "dx": _pack(np.diff(xs)),
+        "dz": _pack(np.diff(zs)),
+        "time_jumps": time_jumps,
+        "events": events,
+    }
+
+
+def decode_trajectory(compact):
+    """Восстанавливает журнал шагов в исходном виде из encode_trajectory."""
+    steps = compact["steps"]
+    if not steps:
+        return []
+    xs = np.concatenate([[compact["x0"]], compact["x0"] + np.cumsum(_unpack(compact["dx"]), dtype=np.int64)])
+    zs = np.concatenate([[compact["z0"]], compact["z0"] + np.cumsum(_unpack(compact["dz"]), dtype=np.int64)])
+    jumps = dict((i, t) for i, t in compact["time_jumps"])
+    events = dict((i, extra) for i, extra in compact["events"])
+    path_log = []
+    t = compact["start_time"]
+    for i in range(steps):
+        if i:
+            t = jumps.get(i, t + BLOCK_TIME_SECONDS)
+        step = {"x": int(xs[i]), "z": int(zs[i]), "time": t}
+        step.update(events.get(i, {}))
+        path_log.append(step)
+    return path_log
+
+
+def is_compact(path):
+    return isinstance(path, dict)
+
+
+def results_to_format(results, trajectory_format):
+    """Приводит поле path результатов клиентов к нужному формату."""
+    converted = []
+    for result in results:
+        path = result["path"]
+        if trajectory_format == "compact" and not is_compact(path):
+            path = encode_trajectory(path)
+        elif trajectory_format == "json" and is_compact(path):
+            path = decode_trajectory(path)
+        converted.append({**result, "path": path})
+    return converted
+
+
+def results_to_npz(results):
+    """
+    Траектории всех клиентов одним .npz: дельты склеены подряд, границы
+    клиентов — offsets (как CSR), время и события хранятся разреженно
+    с глобальным номером шага.
+    """
+    compacts = [path if is_compact(path) else encode_trajectory(path) for path in (r["path"] for r in results)]
+    steps = np.array([c["steps"] for c in compacts], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(steps)])
+    # Первая дельта клиента нулевая, чтобы dx/dz шли вровень с offsets
+    dx = [np.concatenate([[0], _unpack(c["dx"])]) for c in compacts if c["steps"]]
+    dz = [np.concatenate([[0], _unpack(c["dz"])]) for c in compacts if c["steps"]]
+    jump_step, jump_time, events = [], [], []
+    for offset, c in zip(offsets, compacts):
+        for i, t in c.get("time_jumps", []):
+            jump_step.append(offset + i)
+            jump_time.append(t)
+        for i, extra in c.get("events", []):
+            events.append(json.dumps([int(offset + i), extra], ensure_ascii=False))
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        client=np.array([r["client"] for r in results], dtype=str),
+        status=np.array([r["status"] for r in results], dtype=str),
+        end_time=np.array([r["end_time"] for r in results], dtype=float),
+        offsets=offsets,
+        start_time=np.array([c.get("start_time", np.nan) for c in compacts], dtype=float),
+        x0=np.array([c.get("x0", 0) for c in compacts], dtype=np.int16),
+        z0=np.array([c.get("z0", 0) for c in compacts], dtype=np.int16),
+        dx=np.concatenate(dx).astype(np.int16) if dx else np.zeros(0, dtype=np.int16),
+        dz=np.concatenate(dz).astype(np.int16) if dz else np.zeros(0, dtype=np.int16),
+        jump_step=np.array(jump_step, dtype=np.int64),
+        jump_time=np.array(jump_time, dtype=float),
+        events=np.array(events, dtype=str),
+        block_time=np.float64(BLOCK_TIME_SECONDS),
+    )
+    return buffer.getvalue()
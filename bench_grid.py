@@ -0,0 +1,158 @@
+"""
+Замер стоимости симуляции в зависимости от размера карты.
+
+Для каждой стороны N строится магазин N × N: ряды стеллажей 3 × 1 с
+проходами, стеллажи категорий разнесены по всей карте, кассы у дальней
+стены. Печатает время построения StoreModel (с графом проходов для
+planner="corridors"), время, шаги и раскрытия поиска пути на клиента
+для движков сетки, планировщиков и порядка обхода списка покупок
+(route_order) и память под занятость.
+
+    python bench_grid.py
+    python bench_grid.py --sizes 20 100 500 --clients 200 --engines set --planners astar corridors
+    python bench_grid.py --sizes 100 200 --engines set --planners astar --route-orders list tsp
+    python bench_grid.py --routing --shelf-width 20
+"""
+import argparse
+import contextlib
+import io
+import random
+import sys
+import time
+
+import numpy as np
+
+from app.utils.simulations import CustomerGenerator, StoreModel, astar_path, bfs_path
+from app.utils.event_simulation import EventDrivenSimulation
+
+DEFAULT_SIZES = (20, 50, 100, 200, 300, 500)
+
+
+def build_store(size, kasses=4, shelf_width=3):
+    """Магазин size × size с рядами стеллажей через каждые 4 клетки и проходами в 2 клетки."""
+    categories = list(CustomerGenerator().product_categories.items())
+    slots = [(x, z) for z in range(2, size - 3, 4) for x in range(2, size - shelf_width, shelf_width + 2)]
+    # Категории равномерно по слотам, остальные стеллажи — пустые препятствия
+    step = max(1, len(slots) // len(categories))
+    category_slots = {slots[i * step]: categories[i] for i in range(min(len(categories), len(slots)))}
+    shelves = []
+    product_id = 1
+    for shelf_id, (x, z) in enumerate(slots, start=1):
+        products = []
+        category = f"Пустой {shelf_id}"
+        if (x, z) in category_slots:
+            category, data = category_slots[(x, z)]
+            for j, name in enumerate(data["products"]):
+                products.append({"id": product_id, "name": name, "percent_discount": 10 if j % 3 == 0 else None,
+                                 "time_discount_start": None, "time_discount_end": None})
+                product_id += 1
+        shelves.append({"id": shelf_id, "name": category, "category": category, "x": x, "z": z, "width": shelf_width,
+                        "products": products, "attraction": 0.8 if shelf_id % 2 else 0.5})
+    kasses = [{"name": f"Касса {i + 1}", "x": size * (i + 1) // (kasses + 1), "z": size - 1}
+              for i in range(kasses)]
+    return {"name": f"bench {size}", "x": size, "z": size, "shelves": shelves, "kasses": kasses}
+
+
+def occupancy_bytes(sim):
+    grid = sim.current_occupied
+    if sim.grid_engine == "array":
+        return grid.size
+    # Множество кортежей: ~ 72 байта кортеж и ~ 2 слота таблицы на элемент
+    return len(grid) * (72 + 16)
+
+
+def bench(size, clients, engine, planner, shelf_width=3, route_order="list"):
+    store = build_store(size, shelf_width=shelf_width)
+    started = time.perf_counter()
+    model = StoreModel(store)
+    if planner == "corridors":
+        model.corridors()
+    build = time.perf_counter() - started
+    random.seed(42)
+    batch = CustomerGenerator().generate_batch(clients, np.random.default_rng(42))
+    sim = EventDrivenSimulation(store, model=model, grid_engine=engine, planner=planner, route_order=route_order)
+    started = time.perf_counter()
+    # build_report печатает статистику — здесь она не нужна
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = sim.run(batch)
+    elapsed = time.perf_counter() - started
+    stats = report["statistics"]
+    return {
+        "size": size,
+        "engine": engine,
+        "planner": planner,
+        "route_order": route_order,
+        "shelves": len(store["shelves"]),
+        "build_s": build,
+        "client_ms": elapsed / clients * 1000,
+        "steps": sum(len(result["path"]) for result in report["results"]) / clients,
+        "expansions": stats["path_expansions"] / clients,
+        "fields": len(model.distance_fields.fields),
+        "occupancy_kb": occupancy_bytes(sim) / 1024,
+        "completed": stats["completed"] / clients,
+    }
+
+
+def bench_routing(size, shelf_width=3, queries=20):
+    """Только поиск пути от входа до стеллажей без клиентов: мс на запрос."""
+    model = StoreModel(build_store(size, shelf_width=shelf_width))
+    graph = model.corridors()
+    targets = list(model.shelf_info)[::max(1, len(model.shelf_info) // queries)][:queries]
+    if not targets:
+        return None
+    start = (0, 0)
+    obstacles = model.base_occupied_positions
+    timings = {}
+    planners = {
+        "bfs": lambda target: bfs_path(size, size, start, target, obstacles),
+        "astar": lambda target: astar_path(size, size, start, target, obstacles),
+        # Поле строится на цель один раз, дальше путь восстанавливается за O(длины)
+        "field": lambda target: model.distance_fields.get(target).path_from(start),
+        "corridors": lambda target: graph.path(start, target),
+    }
+    for name, find in planners.items():
+        started = time.perf_counter()
+        for target in targets:
+            find(target)
+        timings[name] = (time.perf_counter() - started) / len(targets) * 1000
+    return {"size": size, "nodes": graph.node_count, "cells": size * size, **timings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--engines", nargs="+", default=("set", "array"))
+    parser.add_argument("--planners", nargs="+", default=("astar", "corridors"))
+    parser.add_argument("--route-orders", nargs="+", default=("list", "tsp"))
+    parser.add_argument("--shelf-width", type=int, default=3,
+                        help="длина стеллажа; у гипермаркета длинные ряды, например 20")
+    parser.add_argument("--routing", action="store_true", help="замерить только поиск пути")
+    args = parser.parse_args()
+
+    if args.routing:
+        print(f"{'N':>5} {'cells':>8} {'nodes':>8} {'bfs, ms':>9} {'astar, ms':>10} {'field, ms':>10} {'corr, ms':>9}")
+        for size in args.sizes:
+            row = bench_routing(size, args.shelf_width)
+            if row is None:
+                continue
+            print(f"{row['size']:>5} {row['cells']:>8} {row['nodes']:>8} {row['bfs']:>9.2f} {row['astar']:>10.2f} "
+                  f"{row['field']:>10.2f} {row['corridors']:>9.2f}")
+        return
+
+    header = f"{'N':>5} {'engine':>8} {'planner':>10} {'route':>6} {'shelves':>8} {'build, s':>9} " \
+             f"{'ms/client':>10} {'steps':>8} {'exp/client':>11} {'fields':>7} {'occ, KB':>9} {'completed':>10}"
+    print(header)
+    for size in args.sizes:
+        for engine in args.engines:
+            for planner in args.planners:
+                for route_order in args.route_orders:
+                    row = bench(size, args.clients, engine, planner, args.shelf_width, route_order)
+                    print(f"{row['size']:>5} {row['engine']:>8} {row['planner']:>10} {row['route_order']:>6} "
+                          f"{row['shelves']:>8} {row['build_s']:>9.3f} {row['client_ms']:>10.2f} {row['steps']:>8.1f} "
+                          f"{row['expansions']:>11.1f} {row['fields']:>7} {row['occupancy_kb']:>9.1f} "
+                          f"{row['completed']:>10.2f}")
+                    sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,14 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from app import database
-from app.fastapi_server import start_uvicorn
-import asyncio
-import os
-import sys
+from app.fastapi_server import run_uvicorn
 
-async def main():
+
+def main():
+    # Начальные данные создаются один раз в родителе, до запуска воркеров
     database.create_tables()
-    await start_uvicorn(),
+    database.engine_sync.dispose()
+    run_uvicorn()
 
 if __name__ == "__main__":
-    asyncio.run(main())
-
+    main()
@@ -0,0 +1,27 @@
+import asyncio
+
+from app.utils.batch import aggregate_replicas, run_batch, run_replica
+from app.utils.simulations import run_simulation
+
+
+def test_replica_matches_single_run_with_same_seed(store_schema):
+    replica = run_replica(7, 30, store_schema)
+    single = run_simulation(30, store_schema, seed=7)
+    assert replica["statistics"] == single["statistics"]
+    assert replica["popular_zones"] == single["popular_zones"]
+
+
+def test_aggregate_counts_missing_zones_as_zero(store_schema):
+    replicas = [run_replica(seed, 20, store_schema) for seed in (1, 2, 3)]
+    summary = aggregate_replicas(replicas)
+    assert summary["replicas"] == 3
+    assert summary["statistics"]["total_clients"]["mean"] == 20
+    zone = summary["popular_zones"][0]["visits"]
+    assert zone["min"] <= zone["mean"] <= zone["max"]
+
+
+def test_run_batch_groups_by_num_persons(store_schema):
+    report = asyncio.run(run_batch(store_schema, [10, 20, 10], replicas=2, max_workers=2, route_order="tsp"))
+    assert report["route_order"] == "tsp"
+    assert [batch["num_persons"] for batch in report["batches"]] == [10, 20]
+    assert all(batch["seeds"] == [42, 43] for batch in report["batches"])
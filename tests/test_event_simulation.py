@@ -0,0 +1,29 @@
+import random
+
+from app.utils.event_simulation import EventDrivenSimulation
+from app.utils.simulations import generate_clients, run_simulation
+
+
+def test_event_engine_accounts_for_every_client(store_schema):
+    report = run_simulation(80, store_schema)
+    stats = report["statistics"]
+    assert stats["total_clients"] == 80
+    outcomes = ("completed", "left_due_to_queue", "store_closed", "no_kassa", "no_path_to_kassa",
+                "no_path_to_shelf", "no_start_position")
+    assert sum(stats[key] for key in outcomes) == 80
+    assert sorted(result["client"] for result in report["results"]) == \
+        sorted(client["name"] for client in generate_clients(80))
+
+
+def test_event_engine_is_deterministic_for_a_seed(store_schema):
+    assert run_simulation(40, store_schema, seed=3) == run_simulation(40, store_schema, seed=3)
+
+
+def test_paths_move_one_cell_at_a_time(store_schema):
+    random.seed(1)
+    sim = EventDrivenSimulation(store_schema)
+    for result in sim.run(generate_clients(30, 1))["results"]:
+        path = result["path"]
+        for a, b in zip(path, path[1:]):
+            assert abs(a["x"] - b["x"]) + abs(a["z"] - b["z"]) <= 1
+            assert b["time"] >= a["time"]
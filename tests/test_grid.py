@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from app.utils.event_simulation import EventDrivenSimulation
+from app.utils.grid import DistanceField, OccupancyGrid, obstacle_mask
+from app.utils.simulations import bfs_path, generate_clients
+
+from conftest import random_obstacles
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_array_bfs_matches_set_bfs(seed):
+    rng = random.Random(seed)
+    width, height = rng.randint(3, 15), rng.randint(3, 15)
+    obstacles = random_obstacles(rng, width, height)
+    grid = OccupancyGrid(width, height, obstacles)
+    for _ in range(10):
+        end = (rng.randrange(width), rng.randrange(height))
+        assert grid.bfs_path((0, 0), end) == bfs_path(width, height, (0, 0), end, obstacles)
+
+
+def test_occupancy_grid_set_operations():
+    grid = OccupancyGrid(4, 3, [(1, 1)])
+    assert (1, 1) in grid and (2, 1) not in grid
+    grid.add((2, 1))
+    grid.remove((1, 1))
+    grid.discard((3, 2))
+    assert (2, 1) in grid and (1, 1) not in grid
+    # Клетки за пределами сетки считаются свободными
+    assert (10, 10) not in grid
+
+
+@pytest.mark.parametrize("planner", ["bfs", "astar"])
+def test_array_engine_gives_the_same_report(store_schema, planner):
+    reports = []
+    for engine in ("set", "array"):
+        random.seed(42)
+        sim = EventDrivenSimulation(store_schema, grid_engine=engine, planner=planner)
+        reports.append(sim.run(generate_clients(60, 42)))
+    assert reports[0]["statistics"] == reports[1]["statistics"]
+    assert reports[0]["results"] == reports[1]["results"]
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_distance_field_matches_bfs(seed):
+    rng = random.Random(seed)
+    width, height = rng.randint(3, 15), rng.randint(3, 15)
+    obstacles = random_obstacles(rng, width, height)
+    target = (rng.randrange(width), rng.randrange(height))
+    field = DistanceField(width, height, obstacle_mask(width, height, obstacles), target)
+    for start in [(x, z) for x in range(width) for z in range(height)]:
+        expected = bfs_path(width, height, start, target, obstacles - {start})
+        path = field.path_from(start)
+        if expected is None:
+            assert field.distance(start) is None and path is None
+            continue
+        assert field.distance(start) == len(expected) - 1
+        assert len(path) == len(expected)
+        assert path[0] == start and path[-1] == target
+        assert all(abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 for a, b in zip(path, path[1:]))
+        assert not set(path[1:-1]) & obstacles
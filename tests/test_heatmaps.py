@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.utils.heatmaps import CellCounter, TimeBucketHeatmap, decode_heatmap, encode_heatmap, rebucket_heatmap
+from app.utils.simulations import run_simulation
+
+
+def test_compact_heatmap_round_trip():
+    counts = np.zeros((3, 4, 5), dtype=np.int32)
+    counts[0, 1, 2] = 7
+    counts[2, 3, 4] = 1
+    compact = encode_heatmap(counts, 3600, 8 * 3600)
+    assert compact["shape"] == [3, 4, 5]
+    assert np.array_equal(decode_heatmap(compact), counts)
+
+
+def test_time_buckets_clamp_to_edges():
+    heatmap = TimeBucketHeatmap(2, 2, bucket_seconds=60, start_time=0, end_time=180)
+    heatmap.add(0, -10)
+    heatmap.add(1, 61)
+    heatmap.add(3, 10_000)
+    assert heatmap.counts[0, 0, 0] == 1
+    assert heatmap.counts[1, 0, 1] == 1
+    assert heatmap.counts[2, 1, 1] == 1
+
+
+def test_rebucket_sums_neighbours_and_keeps_partial_tail():
+    counts = np.arange(5 * 2 * 2, dtype=np.int32).reshape(5, 2, 2)
+    merged = rebucket_heatmap(counts, 2)
+    assert merged.shape == (3, 2, 2)
+    assert np.array_equal(merged[0], counts[0] + counts[1])
+    assert np.array_equal(merged[2], counts[4])
+    assert merged.sum() == counts.sum()
+    assert np.array_equal(rebucket_heatmap(counts, 1), counts)
+
+
+def random_visits(seed, count=80):
+    rng = random.Random(seed)
+    # x = -1 и z = 5 — клетки за пределами сетки 7 × 5
+    return [(rng.randint(-1, 6), rng.randint(0, 5)) for _ in range(count)]
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_top_matches_stable_sort_in_first_visit_order(seed):
+    counter = CellCounter(7, 5)
+    reference = {}
+    for pos in random_visits(seed):
+        counter.visit(pos)
+        reference[pos] = reference.get(pos, 0) + 1
+    expected = sorted(reference.items(), key=lambda item: item[1], reverse=True)
+    assert counter.top() == expected
+    for limit in (1, 3, 5, 10, 100):
+        assert counter.top(limit) == expected[:limit]
+    assert counter.top(0) == []
+
+
+def test_popular_zones_limit_keeps_the_busiest_cells(store_schema):
+    full = run_simulation(40, store_schema)["popular_zones"]
+    limited = run_simulation(40, store_schema, popular_zones_limit=5)["popular_zones"]
+    assert limited == full[:5]
@@ -0,0 +1,138 @@
+import asyncio
+import os
+
+from app.utils import jobs as jobs_module
+from app.utils.simulations import generate_clients, run_simulation
+from app.utils.jobs import (
+    JOB_CANCELLED, JOB_COMPLETED, JOB_FINISHED, JobRegistry, QueueFull, SimulationJobs,
+)
+
+
+async def wait_finished(jobs, run_id, timeout=60):
+    for _ in range(int(timeout / 0.05)):
+        job = jobs.get(run_id)
+        if job["status"] in JOB_FINISHED:
+            return job
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"задача {run_id} не завершилась")
+
+
+def test_job_completes_with_result(store_schema):
+    async def scenario():
+        jobs = SimulationJobs(workers=1, queue_depth=2)
+        run_id = jobs.submit(1, store_schema, 20)
+        job = await wait_finished(jobs, run_id)
+        full = jobs.get(run_id, with_result=True)
+        await jobs.shutdown()
+        return job, full
+
+    job, full = asyncio.run(scenario())
+    assert job["status"] == JOB_COMPLETED
+    assert job["progress"] == 1.0
+    # Статус без with_result не тянет отчёт из файла
+    assert "result" not in job
+    assert len(full["result"]["results"]) == 20
+
+
+def test_queue_depth_and_cancel(store_schema):
+    async def scenario():
+        jobs = SimulationJobs(workers=1, queue_depth=2)
+        first = jobs.submit(1, store_schema, 3000)
+        second = jobs.submit(1, store_schema, 3000)
+        try:
+            jobs.submit(1, store_schema, 10)
+            overflow = False
+        except QueueFull:
+            overflow = True
+        assert jobs.cancel(second)
+        assert jobs.cancel(first)
+        statuses = [(await wait_finished(jobs, run_id))["status"] for run_id in (first, second)]
+        cancelled_again = jobs.cancel(first)
+        await jobs.shutdown()
+        return overflow, statuses, cancelled_again
+
+    overflow, statuses, cancelled_again = asyncio.run(scenario())
+    assert overflow
+    assert statuses == [JOB_CANCELLED, JOB_CANCELLED]
+    assert not cancelled_again
+
+
+def test_shutdown_cancels_unfinished_jobs(store_schema):
+    async def scenario():
+        jobs = SimulationJobs(workers=1, queue_depth=2)
+        run_id = jobs.submit(1, store_schema, 3000)
+        await jobs.shutdown()
+        return jobs.get(run_id), jobs.cancel(run_id), jobs.watchers
+
+    job, cancelled, watchers = asyncio.run(scenario())
+    assert job["status"] == JOB_CANCELLED
+    assert not cancelled
+    assert not watchers
+
+
+def test_history_trim_removes_result_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs_module, "JOB_HISTORY_SIZE", 2)
+    registry = JobRegistry()
+    paths = []
+    for i in range(4):
+        run_id = f"run{i}"
+        path = tmp_path / f"{run_id}.json"
+        path.write_text("{}")
+        paths.append(path)
+        registry.add({"run_id": run_id, "status": "queued", "persisted": None}, queue_depth=10)
+        registry.finish(run_id, JOB_COMPLETED, result_path=str(path))
+    assert [path.exists() for path in paths] == [False, False, True, True]
+    assert registry.get("run0") is None
+    assert registry.result_path("run3") == str(paths[3])
+
+
+def test_persisted_profiles_use_the_job_seed(store_schema, monkeypatch):
+    saved = {}
+
+    async def fake_persist(map_id, run_id, store_schema, results, clients):
+        saved["clients"] = [client["shopping_list"] for client in clients]
+        saved["results"] = results
+
+    monkeypatch.setattr(jobs_module, "persist_simulation", fake_persist)
+
+    async def scenario():
+        jobs = SimulationJobs(workers=1, queue_depth=2)
+        run_id = jobs.submit(1, store_schema, 10, persist=True, seed=7)
+        await wait_finished(jobs, run_id)
+        while jobs.persists:
+            await asyncio.sleep(0.05)
+        job = jobs.get(run_id)
+        await jobs.shutdown()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job["persisted"] == "done"
+    assert saved["clients"] == [client["shopping_list"] for client in generate_clients(10, 7)]
+    assert saved["results"] == run_simulation(10, store_schema, seed=7)["results"]
+
+
+def test_workers_share_job_state_through_the_manager(store_schema):
+    manager = jobs_module.start_jobs_manager()
+
+    async def scenario():
+        # Два SimulationJobs — как два воркера uvicorn с одним реестром супервизора
+        owner = SimulationJobs(workers=1, queue_depth=2)
+        other = SimulationJobs(workers=1, queue_depth=2)
+        run_id = owner.submit(1, store_schema, 20)
+        job = await wait_finished(other, run_id)
+        result = other.get(run_id, with_result=True)["result"]
+        busy = owner.submit(1, store_schema, 3000)
+        cancelled = other.cancel(busy)
+        status = (await wait_finished(owner, busy))["status"]
+        await owner.shutdown()
+        await other.shutdown()
+        return job, result, cancelled, status
+
+    try:
+        job, result, cancelled, status = asyncio.run(scenario())
+    finally:
+        manager.shutdown()
+        os.environ.pop(jobs_module.JOBS_MANAGER_ENV, None)
+    assert job["status"] == JOB_COMPLETED
+    assert len(result["results"]) == 20
+    assert cancelled and status == JOB_CANCELLED
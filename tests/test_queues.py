@@ -0,0 +1,56 @@
+import pytest
+
+from app.utils.event_simulation import EventDrivenSimulation
+from app.utils.queues import KASSA_METRICS, KassaQueue
+from app.utils.simulations import generate_clients, run_simulation
+
+
+def test_fifo_service_waits_for_the_previous_client():
+    kassa = KassaQueue(0, (5, 5))
+    assert kassa.join("a", 100.0, 30.0) == (100.0, 130.0, None)
+    assert kassa.join("b", 110.0, 20.0) == (130.0, 150.0, None)
+    assert kassa.join("c", 200.0, 10.0) == (200.0, 210.0, None)
+    assert len(kassa) == 3
+    assert [kassa.leave() for _ in range(3)] == ["a", "b", "c"]
+    assert kassa.served == 3 and kassa.max_length == 3
+    assert kassa.waits == [0.0, 20.0, 0.0]
+
+
+def test_breakdown_delays_everyone_behind():
+    kassa = KassaQueue(0, (5, 5))
+    kassa.join("a", 0.0, 10.0)
+    start, finish, broken_at = kassa.join("b", 5.0, 10.0, repair_time=600.0)
+    assert (start, finish, broken_at) == (610.0, 620.0, 10.0)
+    assert kassa.join("c", 6.0, 10.0)[0] == 620.0
+    assert kassa.breakdowns == 1 and kassa.down_time == 600.0
+
+
+def test_statistics():
+    kassa = KassaQueue(1, (3, 4))
+    for i in range(4):
+        kassa.join(str(i), 10.0 * i, 20.0)
+    kassa.balk()
+    stats = kassa.statistics(0.0, 1000.0)
+    assert set(KASSA_METRICS) <= set(stats)
+    assert (stats["kassa"], stats["x"], stats["z"]) == (2, 3, 4)
+    assert stats["balked"] == 1
+    assert stats["busy_time"] == 80.0 and stats["utilization"] == 0.08
+    assert stats["wait_mean"] == pytest.approx((0 + 10 + 20 + 30) / 4)
+    assert KassaQueue(0, (0, 0)).statistics(0.0, 1.0)["wait_p99"] == 0.0
+
+
+def test_run_reports_each_kassa(store_schema):
+    report = run_simulation(60, store_schema)
+    kassas = report["kassa_statistics"]
+    assert len(kassas) == len(store_schema["kasses"])
+    served = sum(kassa["served"] for kassa in kassas)
+    assert served == report["statistics"]["completed"]
+
+
+def test_short_queue_limit_makes_clients_balk(store_schema):
+    # Одна касса и очередь не длиннее одного клиента: под нагрузкой часть уходит
+    store_schema["kasses"] = store_schema["kasses"][:1]
+    sim = EventDrivenSimulation(store_schema, max_queue_length=1)
+    report = sim.run(generate_clients(300, 42))
+    assert report["statistics"]["left_due_to_queue"] > 0
+    assert report["kassa_statistics"][0]["balked"] == report["statistics"]["left_due_to_queue"]
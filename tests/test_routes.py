@@ -0,0 +1,66 @@
+import itertools
+import math
+import random
+
+import pytest
+
+from app.utils.routes import order_shelves, order_stops, route_cost
+from app.utils.simulations import StoreModel, run_simulation
+
+
+def random_instance(rng, n):
+    points = [(rng.randint(0, 30), rng.randint(0, 30)) for _ in range(n + 1)]
+    dist = [[abs(a[0] - b[0]) + abs(a[1] - b[1]) for b in points[1:]] for a in points]
+    exit_point = (30, 30)
+    exit_dist = [abs(p[0] - exit_point[0]) + abs(p[1] - exit_point[1]) for p in points[1:]]
+    return dist[0], dist[1:], exit_dist
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_order_is_a_permutation_no_worse_than_the_list(seed):
+    rng = random.Random(seed)
+    start_dist, shelf_dist, exit_dist = random_instance(rng, rng.randint(1, 9))
+    shelves = list(range(len(start_dist)))
+    order = order_shelves(start_dist, shelf_dist, exit_dist, shelves)
+    assert sorted(order) == shelves
+    assert route_cost(order, start_dist, shelf_dist, exit_dist) <= route_cost(shelves, start_dist, shelf_dist, exit_dist)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_small_routes_are_close_to_optimal(seed):
+    rng = random.Random(seed)
+    start_dist, shelf_dist, exit_dist = random_instance(rng, 6)
+    shelves = list(range(6))
+    best = min(route_cost(list(p), start_dist, shelf_dist, exit_dist) for p in itertools.permutations(shelves))
+    cost = route_cost(order_shelves(start_dist, shelf_dist, exit_dist, shelves), start_dist, shelf_dist, exit_dist)
+    # 2-opt не обещает оптимум, но на шести стеллажах уходит от него недалеко
+    assert cost <= best * 1.25
+
+
+def test_order_stops_keeps_items_of_a_shelf_together(store_schema):
+    routes = StoreModel(store_schema).routes()
+    shelves = routes.shelves
+    stops = [("a", shelves[5]), ("b", shelves[0]), ("c", shelves[5]), ("d", (-1, -1)), ("e", shelves[3])]
+    ordered = order_stops(routes, (0, 0), stops)
+    assert sorted(ordered) == ["a", "b", "c", "d", "e"]
+    assert ordered.index("c") == ordered.index("a") + 1
+    # Остановки у неизвестных стеллажей остаются в конце
+    assert ordered[-1] == "d"
+
+
+def test_route_matrix_distances(store_schema):
+    model = StoreModel(store_schema)
+    routes = model.routes()
+    assert (routes.dist.diagonal() == 0).all()
+    assert all(not math.isinf(d) for d in routes.exit_dist)
+    a, b = routes.shelves[0], routes.shelves[-1]
+    assert routes.shelf_dist[0][-1] == model.distance_fields.get(b).distance(a)
+
+
+def test_tsp_order_shortens_client_paths(store_schema):
+    steps = {}
+    for route_order in ("list", "tsp"):
+        report = run_simulation(60, store_schema, route_order=route_order)
+        assert report["statistics"]["total_clients"] == 60
+        steps[route_order] = sum(len(result["path"]) for result in report["results"])
+    assert steps["tsp"] < steps["list"]
@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from app.utils.corridors import CorridorGraph
+from app.utils.event_simulation import EventDrivenSimulation
+from app.utils.grid import obstacle_mask
+from app.utils.simulations import astar_path, bfs_path, generate_clients, repair_path
+
+from conftest import random_obstacles
+
+
+def assert_valid_path(path, start, goal, obstacles):
+    assert path[0] == start and path[-1] == goal
+    assert all(abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 for a, b in zip(path, path[1:]))
+    assert not set(path[1:-1]) & obstacles
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_astar_is_as_short_as_bfs(seed):
+    rng = random.Random(seed)
+    width, height = rng.randint(3, 20), rng.randint(3, 20)
+    obstacles = random_obstacles(rng, width, height)
+    for _ in range(10):
+        goal = (rng.randrange(width), rng.randrange(height))
+        expected = bfs_path(width, height, (0, 0), goal, obstacles)
+        path = astar_path(width, height, (0, 0), goal, obstacles)
+        if expected is None:
+            assert path is None
+        else:
+            assert len(path) == len(expected)
+            assert_valid_path(path, (0, 0), goal, obstacles)
+
+
+def test_astar_reaches_the_nearest_of_several_goals():
+    path = astar_path(10, 10, (0, 0), {(9, 9), (0, 3)}, set())
+    assert path == [(0, 0), (0, 1), (0, 2), (0, 3)]
+
+
+def test_astar_respects_max_expansions():
+    stats = {"path_expansions": 0}
+    assert astar_path(30, 30, (0, 0), (29, 29), set(), max_expansions=5, stats=stats) is None
+    assert stats["path_expansions"] == 6
+
+
+def test_repair_path_goes_around_a_blocked_cell():
+    path = [(x, 2) for x in range(8)]
+    blocked = {(3, 2)}
+    repaired = repair_path(path, 3, (2, 2), blocked, 8, 5)
+    assert repaired is not None
+    assert (3, 2) not in repaired
+    assert repaired[-1] == (7, 2)
+    assert all(abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1 for a, b in zip(repaired, repaired[1:]))
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_corridor_paths_are_as_short_as_bfs(seed):
+    rng = random.Random(seed)
+    width, height = rng.randint(3, 20), rng.randint(3, 20)
+    obstacles = random_obstacles(rng, width, height, density=rng.choice((0.1, 0.3)))
+    graph = CorridorGraph(width, height, obstacle_mask(width, height, obstacles))
+    for _ in range(10):
+        start = (rng.randrange(width), rng.randrange(height))
+        goal = (rng.randrange(width), rng.randrange(height))
+        # Как и bfs_path, граф разрешает стартовать с препятствия и прийти в него
+        expected = bfs_path(width, height, start, goal, obstacles - {start})
+        path = graph.path(start, goal)
+        if expected is None:
+            assert path is None
+        else:
+            assert len(path) == len(expected)
+            assert_valid_path(path, start, goal, obstacles)
+
+
+def test_corridor_planner_completes_a_run(store_schema):
+    reports = {}
+    for planner in ("astar", "corridors"):
+        random.seed(42)
+        sim = EventDrivenSimulation(store_schema, planner=planner)
+        reports[planner] = sim.run(generate_clients(60, 42))
+    # В маленьком магазине без пробок все клиенты успевают с любым планировщиком
+    assert reports["astar"]["statistics"]["completed"] == 60
+    assert reports["corridors"]["statistics"]["completed"] == 60
+    assert reports["corridors"]["statistics"]["path_expansions"] > 0
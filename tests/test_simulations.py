@@ -0,0 +1,14 @@
+import asyncio
+import json
+
+import pytest
+
+from app.utils.simulations import main
+
+
+@pytest.mark.parametrize("engine", ["events", "async"])
+def test_main_runs_end_to_end(store_schema, engine):
+    report = json.loads(asyncio.run(main(30, store_schema, engine=engine)))
+    assert report["statistics"]["total_clients"] == 30
+    assert len(report["results"]) == 30
+    assert report["popular_zones"]
@@ -0,0 +1,45 @@
+import io
+
+import numpy as np
+
+from app.utils.simulations import BLOCK_TIME_SECONDS, run_simulation
+from app.utils.trajectories import decode_trajectory, encode_trajectory, results_to_format, results_to_npz
+
+
+def test_round_trip_keeps_time_jumps_and_events():
+    t = 8 * 3600
+    path = [
+        {"x": 1, "z": 1, "time": t},
+        {"x": 2, "z": 1, "time": t + BLOCK_TIME_SECONDS},
+        {"x": 2, "z": 2, "time": t + 60, "action": "purchase", "item": "хлеб"},
+        {"x": 2, "z": 2, "time": t + 60 + BLOCK_TIME_SECONDS},
+        {"x": 0, "z": 0, "time": t + 120, "action": "queue"},
+    ]
+    compact = encode_trajectory(path)
+    assert compact["steps"] == 5
+    assert [i for i, _ in compact["events"]] == [2, 4]
+    assert decode_trajectory(compact) == path
+
+
+def test_empty_path():
+    assert encode_trajectory([]) == {"steps": 0}
+    assert decode_trajectory({"steps": 0}) == []
+
+
+def test_compact_run_decodes_to_the_json_run(store_schema):
+    plain = run_simulation(30, store_schema)["results"]
+    compact = run_simulation(30, store_schema, trajectory_format="compact")["results"]
+    assert results_to_format(compact, "json") == plain
+    assert results_to_format(plain, "compact") == compact
+
+
+def test_npz_concatenates_client_steps(store_schema):
+    results = run_simulation(20, store_schema)["results"]
+    with np.load(io.BytesIO(results_to_npz(results))) as npz:
+        offsets = npz["offsets"]
+        assert offsets[-1] == sum(len(r["path"]) for r in results)
+        for k, result in enumerate(results):
+            path = result["path"]
+            if path:
+                assert npz["x0"][k] == path[0]["x"]
+                assert npz["dx"][offsets[k]:offsets[k + 1]].sum() == path[-1]["x"] - path[0]["x"]